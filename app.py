@@ -1,17 +1,34 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, session, jsonify
+from flask import Flask, request, render_template, redirect, url_for, flash, session, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.security import check_password_hash
+from markupsafe import Markup
 from datetime import datetime
-import hmac
+import calendar
 import hashlib
 import json
 import os
 from pathlib import Path
 import math
 import threading
-import queue
+import heapq
+import re
+from contextlib import ExitStack
+from functools import wraps
+from itertools import islice, chain
+from urllib.parse import quote
 
 # 导入配置
 from config import config
+from field_index import match_filters
+from scan_engine import ScanEngine, build_spec, scan_messages
+from result_cache import ResultCache, FragmentCache
+from request_body import WebhookBody, BodyTooLarge, SignatureVerifier, split_secrets
+from message_record import MessageRecord, json_default, encode_data, compact_payload, parse_timestamp
+from message_store import MessageStore, load_archive_messages
+from blob_store import iter_blob
+from event_broadcast import EventBroadcaster, StatsDeltaPublisher
+from response_compression import is_compressible, choose_encoding, compress_body, StreamCompressor
+from archive_segments import open_segment, timestamp_key, load_legacy_archive, Manifest
 
 # 加载环境变量
 try:
@@ -21,7 +38,17 @@ except ImportError:
     # 如果没有安装python-dotenv，忽略
     pass
 
+class MessageJSONProvider(DefaultJSONProvider):
+    """JSON响应中的活跃消息记录按字典序列化"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, MessageRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = MessageJSONProvider(app)
 app.secret_key = config.SECRET_KEY
 
 # 从配置文件获取配置
@@ -33,11 +60,25 @@ DATA_DIR = config.DATA_DIR
 MESSAGES_FILE = config.MESSAGES_FILE
 SETTINGS_FILE = config.SETTINGS_FILE
 ARCHIVE_DIR = config.ARCHIVE_DIR
+SOURCES_DIR = config.SOURCES_DIR
 
 # 存储配置
-MAX_MESSAGES_PER_FILE = config.MAX_MESSAGES_PER_FILE
-MAX_ACTIVE_MESSAGES = config.MAX_ACTIVE_MESSAGES
 PAGE_SIZE = config.PAGE_SIZE
+SCAN_WORKERS = config.SCAN_WORKERS
+RESULT_CACHE_MAX_BYTES = config.RESULT_CACHE_MAX_BYTES
+FRAGMENT_CACHE_ENTRIES = config.FRAGMENT_CACHE_ENTRIES
+MAX_WEBHOOK_BODY_SIZE = config.MAX_WEBHOOK_BODY_SIZE
+WEBHOOK_SPILL_SIZE = config.WEBHOOK_SPILL_SIZE
+ENABLE_SIGNATURE_VERIFICATION = config.ENABLE_SIGNATURE_VERIFICATION
+SIGNATURE_HEADERS = config.SIGNATURE_HEADERS
+SSE_HEARTBEAT_INTERVAL = config.SSE_HEARTBEAT_INTERVAL
+SSE_COALESCE_WINDOW_MS = config.SSE_COALESCE_WINDOW_MS
+SSE_MAX_BATCH = config.SSE_MAX_BATCH
+SSE_BUFFER_EVENTS = config.SSE_BUFFER_EVENTS
+SSE_STATS_INTERVAL_MS = config.SSE_STATS_INTERVAL_MS
+RESPONSE_COMPRESSION = config.RESPONSE_COMPRESSION
+COMPRESSION_MIN_SIZE = config.COMPRESSION_MIN_SIZE
+COMPRESSION_LEVEL = config.COMPRESSION_LEVEL
 
 # 确保数据目录存在
 config.ensure_directories()
@@ -45,152 +86,146 @@ config.ensure_directories()
 # 默认设置
 DEFAULT_SETTINGS = config.DEFAULT_SETTINGS
 
-def load_messages():
-    """从文件加载消息"""
-    try:
-        if MESSAGES_FILE.exists():
-            with open(MESSAGES_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"加载消息失败: {e}")
-    return []
+# 命名来源名称（用于 /webhook/<source> 和分区目录名）
+SOURCE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
 
-def archive_old_messages():
-    """归档旧消息到时间文件夹"""
-    global webhook_messages
-    
+# 时间参数：日期，或日期加 HH:MM[:SS[.ffffff]]，带时间时可以有时区（Z 或 ±HH:MM）
+TIME_PARAM_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(:\d{2}(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}:?\d{2})?)?$')
+
+def parse_time_param(value, end=False):
+    """
+    解析时间参数（YYYY-MM-DD、YYYY-MM-DD HH:MM[:SS] 或 YYYY-MM-DDTHH:MM），返回时间戳键；未提供时返回None，
+    格式无效时抛出ValueError。带时区的时间转换为服务器本地时间（与消息时间一致）；
+    end为True时不完整的时间延伸到该单位的最后一秒（日期为当天最后一秒，HH:MM为该分钟最后一秒）
+    """
+    if not value or not value.strip():
+        return None
+    value = value.strip()
+    match = TIME_PARAM_PATTERN.match(value)
     try:
-        if len(webhook_messages) <= MAX_ACTIVE_MESSAGES:
-            return True
-        
-        # 计算需要归档的消息数量
-        archive_count = len(webhook_messages) - MAX_ACTIVE_MESSAGES
-        
-        # 获取需要归档的消息（最旧的消息）
-        messages_to_archive = webhook_messages[-archive_count:]
-        
-        # 按时间分组归档
-        archive_groups = {}
-        for msg in messages_to_archive:
-            timestamp = datetime.strptime(msg['timestamp'], '%Y-%m-%d %H:%M:%S')
-            date_key = timestamp.strftime('%Y-%m-%d')
-            
-            if date_key not in archive_groups:
-                archive_groups[date_key] = []
-            archive_groups[date_key].append(msg)
-        
-        # 保存归档文件
-        for date_key, messages in archive_groups.items():
-            archive_file = ARCHIVE_DIR / f'messages_{date_key}.json'
-            
-            # 如果文件已存在，合并消息
-            existing_messages = []
-            if archive_file.exists():
-                with open(archive_file, 'r', encoding='utf-8') as f:
-                    existing_messages = json.load(f)
-            
-            # 合并并按ID去重
-            all_messages = existing_messages + messages
-            unique_messages = {}
-            for msg in all_messages:
-                unique_messages[msg['id']] = msg
-            
-            # 按时间排序
-            sorted_messages = sorted(unique_messages.values(), 
-                                   key=lambda x: x['timestamp'], reverse=True)
-            
-            with open(archive_file, 'w', encoding='utf-8') as f:
-                json.dump(sorted_messages, f, ensure_ascii=False, indent=2)
-        
-        # 从活跃消息中移除已归档的消息
-        webhook_messages = webhook_messages[:-archive_count]
-        
-        print(f"已归档 {archive_count} 条消息")
+        if match is None:
+            raise ValueError(value)
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'无效的时间参数: {value}（格式为 YYYY-MM-DD 或 YYYY-MM-DDTHH:MM[:SS]）')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    key = calendar.timegm(parsed.timetuple())
+    if end:
+        if len(value) == 10:
+            key += 86399
+        elif match.group(1) is None:
+            key += 59
+    return key
+
+def parse_time_range(args):
+    """解析请求参数中的 from/to 时间范围，返回 (start_key, end_key)，格式无效时抛出ValueError"""
+    return parse_time_param(args.get('from')), parse_time_param(args.get('to'), end=True)
+
+def in_time_range(message, start_key=None, end_key=None):
+    """检查消息时间是否在 [start_key, end_key] 范围内"""
+    if start_key is None and end_key is None:
         return True
-        
-    except Exception as e:
-        print(f"归档消息失败: {e}")
-        return False
+    key = timestamp_key(message['timestamp'])
+    return (start_key is None or key >= start_key) and (end_key is None or key <= end_key)
 
-def get_next_message_id():
-    """获取下一个消息ID，考虑所有消息（包括归档的）"""
-    max_id = 0
-    
-    # 1. 检查内存中的活跃消息
-    if webhook_messages:
-        max_id = max(max_id, max(msg.get('id', 0) for msg in webhook_messages))
-    
-    # 2. 检查所有归档文件中的消息
-    try:
-        archived_files = get_archived_files()
+def merge_archived_page(store, active_messages, start_index, end_index, start_key=None, end_key=None):
+    """
+    按时间归并活跃消息和归档段，只解码目标页的记录；
+    指定时间范围时只打开清单中时间范围重叠的归档段，并在段内二分查找
+    返回 (页内消息, 消息总数)
+    """
+    with ExitStack() as stack:
+        streams = [[(timestamp_key(msg['timestamp']), msg) for msg in active_messages]]
+        total_messages = len(active_messages)
+        
+        archived_files = store.get_archived_files()
+        manifest_entries = store.refresh_manifest(archived_files)
         for archive_info in archived_files:
+            entry = manifest_entries.get(Path(archive_info['file']).name)
+            if entry is None or not Manifest.overlaps(entry, start_key, end_key):
+                continue
             try:
-                with open(archive_info['file'], 'r', encoding='utf-8') as f:
-                    archived_messages = json.load(f)
-                    if archived_messages:
-                        max_id = max(max_id, max(msg.get('id', 0) for msg in archived_messages))
+                if archive_info['format'] != 'json':
+                    segment = stack.enter_context(open_segment(archive_info['file']))
+                    start, stop = segment.index_range(start_key, end_key)
+                    streams.append(segment.iter_keys_desc(start, stop))
+                    total_messages += stop - start
+                else:
+                    archived_messages = [msg for msg in load_legacy_archive(archive_info['file'])
+                                         if in_time_range(msg, start_key, end_key)]
+                    archived_messages.sort(key=lambda x: x['timestamp'], reverse=True)
+                    streams.append([(timestamp_key(msg['timestamp']), msg) for msg in archived_messages])
+                    total_messages += len(archived_messages)
             except Exception as e:
-                print(f"读取归档文件 {archive_info['file']} 失败: {e}")
-    except Exception as e:
-        print(f"检查归档文件失败: {e}")
-    
-    return max_id + 1
+                print(f"读取归档文件失败: {e}")
+        
+        merged = heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+        page_messages = []
+        for _, ref in islice(merged, start_index, end_index):
+            if isinstance(ref, tuple):
+                segment, i = ref
+                page_messages.append(segment.read(i))
+            else:
+                page_messages.append(ref)
+        
+        return page_messages, total_messages
 
-def get_archived_files():
-    """获取所有归档文件列表"""
-    try:
-        archive_files = []
-        for file_path in ARCHIVE_DIR.glob('messages_*.json'):
-            date_str = file_path.stem.replace('messages_', '')
-            archive_files.append({
-                'date': date_str,
-                'file': str(file_path),
-                'size': file_path.stat().st_size
-            })
-        return sorted(archive_files, key=lambda x: x['date'], reverse=True)
-    except Exception as e:
-        print(f"获取归档文件失败: {e}")
-        return []
+def build_pagination(page, page_size, total_messages):
+    """生成分页信息"""
+    total_pages = math.ceil(total_messages / page_size)
+    return {
+        'current_page': page,
+        'total_pages': total_pages,
+        'total_messages': total_messages,
+        'page_size': page_size,
+        'has_prev': page > 1,
+        'has_next': page < total_pages
+    }
 
-def get_paginated_messages(page=1, page_size=PAGE_SIZE, include_archived=False):
-    """获取分页消息"""
-    global webhook_messages
-    
+def cached_query(kind):
+    """
+    查询结果缓存装饰器（被装饰函数的第一个参数为存储分区）：
+    缓存键由分区名、查询类型、参数、存储版本和归档清单版本组成，
+    接收、归档、清空或归档文件被外部修改后不会命中旧结果
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(store, *args, **kwargs):
+            try:
+                store.refresh_manifest()
+            except Exception as e:
+                print(f"同步归档清单失败 [{store.label}]: {e}")
+            key = (store.name, kind, json.dumps([args, kwargs], sort_keys=True, default=str),
+                   store.version, store.manifest.version)
+            result = result_cache.get(key)
+            if result is None:
+                result = func(store, *args, **kwargs)
+                result_cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
+
+@cached_query('page')
+def get_paginated_messages(store, page=1, page_size=PAGE_SIZE, include_archived=False, start_key=None, end_key=None):
+    """获取分页消息（可按时间范围过滤）"""
     try:
-        all_messages = webhook_messages.copy()
-        
-        # 如果需要包含归档消息
-        if include_archived:
-            archived_files = get_archived_files()
-            for archive_info in archived_files:
-                try:
-                    with open(archive_info['file'], 'r', encoding='utf-8') as f:
-                        archived_messages = json.load(f)
-                        all_messages.extend(archived_messages)
-                except Exception as e:
-                    print(f"读取归档文件失败: {e}")
-        
         # 按时间排序（最新的在前）
-        all_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        # 分页计算
-        total_messages = len(all_messages)
-        total_pages = math.ceil(total_messages / page_size)
+        active_messages = sorted((msg for msg in store.messages if in_time_range(msg, start_key, end_key)),
+                                 key=lambda x: x['timestamp'], reverse=True)
         start_index = (page - 1) * page_size
         end_index = start_index + page_size
         
-        page_messages = all_messages[start_index:end_index]
+        if include_archived:
+            page_messages, total_messages = merge_archived_page(store, active_messages, start_index, end_index,
+                                                                start_key, end_key)
+        else:
+            page_messages = active_messages[start_index:end_index]
+            total_messages = len(active_messages)
         
         return {
             'messages': page_messages,
-            'pagination': {
-                'current_page': page,
-                'total_pages': total_pages,
-                'total_messages': total_messages,
-                'page_size': page_size,
-                'has_prev': page > 1,
-                'has_next': page < total_pages
-            }
+            'pagination': build_pagination(page, page_size, total_messages)
         }
         
     except Exception as e:
@@ -207,19 +242,227 @@ def get_paginated_messages(page=1, page_size=PAGE_SIZE, include_archived=False):
             }
         }
 
-def save_messages(messages):
-    """保存消息到文件，并自动归档"""
+def not_modified_response(snapshot):
+    """客户端缓存仍然有效时返回304响应，否则返回None（不访问存储；压缩后的响应ETag为弱ETag，按弱比较）"""
+    if request.if_none_match.contains_weak(snapshot.etag):
+        return apply_cache_headers(app.response_class(status=304), snapshot)
+    return None
+
+def apply_cache_headers(response, snapshot):
+    """
+    为API响应添加ETag/Last-Modified，并要求浏览器每次重新验证
+    使用请求开始时取得的存储快照：响应数据不会比ETag对应的版本旧，并发写入后客户端只会多验证一次
+    """
+    response.set_etag(snapshot.etag)
+    response.last_modified = snapshot.last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.after_request
+def compress_response(response):
+    """
+    按 Accept-Encoding 压缩响应：超过 COMPRESSION_MIN_SIZE 的JSON、HTML和文本整体压缩，SSE流逐帧压缩并同步刷新。
+    带ETag的快照响应压缩后缓存在查询结果缓存中（按压缩前内容的哈希），相同内容只压缩一次
+    """
+    if not RESPONSE_COMPRESSION or not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 206, 304) or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        # 其他流式响应（NDJSON扫描、转存payload）逐块返回，不压缩
+        if response.mimetype != 'text/event-stream':
+            return response
+        response.response = StreamCompressor(encoding, COMPRESSION_LEVEL).stream(response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESSION_MIN_SIZE:
+            return response
+        etag, _ = response.get_etag()
+        key = None
+        compressed = None
+        if etag:
+            key = (request.args.get('source', '').strip(), 'compressed', encoding, COMPRESSION_LEVEL,
+                   hashlib.blake2b(body, digest_size=16).digest())
+            compressed = result_cache.get(key)
+        if compressed is None:
+            compressed = compress_body(body, encoding, COMPRESSION_LEVEL)
+            if key is not None:
+                result_cache.put(key, compressed)
+        response.set_data(compressed)
+        if etag:
+            # 压缩后的表示与原内容字节不同，使用弱ETag
+            response.set_etag(etag, weak=True)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def encode_json(value):
+    """编码为紧凑JSON字节"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def encode_message(store, message):
+    """消息的JSON片段：活跃消息记录直接拼接原始字节，归档消息编码一次后缓存"""
+    if isinstance(message, MessageRecord):
+        return message.to_json()
+    return fragment_cache.get('json', message, encode_json, store.name)
+
+def encode_summary(store, message):
+    """消息摘要的JSON片段（编码一次后缓存）"""
+    return fragment_cache.get('summary', message, lambda msg: encode_json(store.get_message_summary(msg)),
+                              store.name)
+
+def render_message_row(store, message):
+    """Dashboard消息行HTML（渲染一次后缓存）"""
+    return fragment_cache.get(
+        'row', message,
+        lambda msg: Markup(render_template('message_row.html', message=store.get_message_summary(msg))),
+        store.name)
+
+def render_archived_info(store, archived_count):
+    """Dashboard归档信息HTML（按分区和归档清单版本缓存，归档文件变化后清单版本递增）"""
+    return fragment_cache.lookup(
+        (store.name, 'archives', store.manifest.version, archived_count),
+        lambda: Markup(render_template('archived_info.html', archived_count=archived_count)))
+
+def messages_json_response(result, fragments):
+    """将预编码的消息片段和结果中的其余字段拼接为JSON响应，不再逐条序列化消息"""
+    rest = encode_json({key: value for key, value in result.items() if key != 'messages'})
+    body = b'{"messages":[' + b','.join(fragments) + b']' + (b',' + rest[1:] if len(rest) > 2 else b'}')
+    return app.response_class(body, mimetype='application/json')
+
+def spilled_message_response(store, message):
+    """转存payload的完整消息：其余字段编码后，data从blob文件按块流式拼接，不整体读入内存（blob不存在时返回None）"""
+    spilled = message['data_spilled']
+    if not store.blobs.path(spilled['ref']).exists():
+        return None
+    head = encode_json({key: value for key, value in message.items() if key != 'data'})
+    
+    def generate():
+        yield head[:-1] + b',"data":'
+        yield from iter_blob(store.blobs.blob_dir, spilled['ref'])
+        yield b'}'
+    
+    return app.response_class(generate(), mimetype='application/json')
+
+@cached_query('search')
+def search_messages(store, query, page=1, page_size=PAGE_SIZE, include_archived=True):
+    """全文搜索消息，返回按相关度排序的分页摘要"""
     try:
-        # 先归档旧消息
-        archive_old_messages()
+        results = store.search_index.search(query, include_archived=include_archived)
+        start_index = (page - 1) * page_size
         
-        # 保存当前活跃消息
-        with open(MESSAGES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
-        return True
+        page_messages = []
+        for message_id, score in results[start_index:start_index + page_size]:
+            message = store.get_message_by_id(message_id)
+            if message is not None:
+                page_messages.append(dict(store.get_message_summary(message), score=round(score, 4)))
+        
+        return {
+            'query': query,
+            'messages': page_messages,
+            'pagination': build_pagination(page, page_size, len(results))
+        }
     except Exception as e:
-        print(f"保存消息失败: {e}")
-        return False
+        print(f"搜索消息失败: {e}")
+        return {
+            'query': query,
+            'messages': [],
+            'pagination': build_pagination(1, page_size, 0)
+        }
+
+def match_message(message, filters):
+    """逐条匹配字段过滤条件（活跃消息记录匹配后丢弃解析的data，活跃列表中只保留原始字节）"""
+    try:
+        return match_filters(message, filters)
+    finally:
+        if isinstance(message, MessageRecord):
+            message.release()
+
+def get_field_filters(args):
+    """从查询参数中提取字段过滤条件（参数名为以 data. 开头的JSON路径）"""
+    return {key: value for key, value in args.items() if key.startswith('data.')}
+
+@cached_query('filter')
+def filter_messages(store, filters, page=1, page_size=PAGE_SIZE, include_archived=False):
+    """按字段值过滤消息：已建立索引的路径使用字段索引，其余路径逐条匹配"""
+    try:
+        field_index = store.field_index
+        indexed = {path: value for path, value in filters.items() if path in field_index.paths}
+        unindexed = {path: value for path, value in filters.items() if path not in indexed}
+        archived_files = store.get_archived_files() if include_archived else []
+        start_index = (page - 1) * page_size
+        
+        active_by_id = {msg['id']: msg for msg in store.messages}
+        
+        def fetch(message_id):
+            return store.fetch_message(message_id, active_by_id)
+        
+        if indexed:
+            segments = [(info['file'], lambda info=info: load_archive_messages(info)) for info in archived_files]
+            candidate_ids = sorted(field_index.lookup(indexed, segments), reverse=True)
+            
+            if not unindexed:
+                # 全部条件都有索引：只读取当前页的消息
+                page_messages = [msg for msg in map(fetch, candidate_ids[start_index:start_index + page_size])
+                                 if msg is not None]
+                total_messages = len(candidate_ids)
+            else:
+                matched = [msg for msg in map(fetch, candidate_ids)
+                           if msg is not None and match_message(msg, unindexed)]
+                page_messages = matched[start_index:start_index + page_size]
+                total_messages = len(matched)
+        else:
+            # 没有可用索引：归档文件交给扫描引擎并行过滤，只传回命中消息的ID，再读取当前页
+            spec = build_spec(unindexed, fields=['id'])
+            matched_ids = [msg['id'] for msg in store.messages if match_message(msg, unindexed)]
+            for _, results in scan_engine.scan([info['file'] for info in archived_files], spec):
+                matched_ids.extend(item['id'] for item in results)
+            matched_ids.sort(reverse=True)
+            page_messages = [msg for msg in map(fetch, matched_ids[start_index:start_index + page_size])
+                             if msg is not None]
+            total_messages = len(matched_ids)
+        
+        return {
+            'messages': page_messages,
+            'filters': filters,
+            'pagination': build_pagination(page, page_size, total_messages)
+        }
+    except Exception as e:
+        print(f"过滤消息失败: {e}")
+        return {
+            'messages': [],
+            'filters': filters,
+            'pagination': build_pagination(1, page_size, 0)
+        }
+
+def get_messages_since(store, since_id, limit=PAGE_SIZE):
+    """获取ID大于since_id的新消息（只读取内存中的活跃消息头部）"""
+    new_messages = []
+    has_more = False
+    
+    # 活跃消息按最新在前排列，遇到旧消息即可停止
+    for msg in store.messages:
+        if msg.get('id', 0) <= since_id:
+            break
+        if len(new_messages) >= limit:
+            has_more = True
+            break
+        new_messages.append(msg)
+    
+    latest_id = new_messages[0]['id'] if new_messages else since_id
+    
+    return {
+        'messages': new_messages,
+        'since_id': since_id,
+        'latest_id': latest_id,
+        'has_more': has_more  # 新消息超过limit时客户端应重新获取整页
+    }
 
 def load_settings():
     """从文件加载设置"""
@@ -246,43 +489,126 @@ def save_settings(settings):
         print(f"保存设置失败: {e}")
         return False
 
-# 加载数据
-webhook_messages = load_messages()
+def parse_sources(text):
+    """
+    解析设置页面中的命名来源配置（JSON对象：{来源名: {secret, enabled, event_filter, retention_days}}），
+    格式错误时抛出ValueError
+    """
+    sources = json.loads(text) if text.strip() else {}
+    if not isinstance(sources, dict):
+        raise ValueError('来源配置必须是JSON对象')
+    
+    parsed = {}
+    for name, options in sources.items():
+        if not SOURCE_NAME_PATTERN.match(name):
+            raise ValueError(f'来源名只能包含字母、数字、下划线和连字符: {name}')
+        if not isinstance(options, dict):
+            raise ValueError(f'来源 {name} 的配置必须是JSON对象')
+        parsed[name] = {
+            'secret': '\n'.join(split_secrets(options.get('secret'))),
+            'enabled': bool(options.get('enabled', True)),
+            'event_filter': str(options.get('event_filter') or ''),
+            'retention_days': int(options.get('retention_days') or 0)
+        }
+    return parsed
+
+# 加载设置
 webhook_settings = load_settings()
 
-# 实时推送队列
-message_queue = queue.Queue()
-active_connections = set()  # 存储活跃的SSE连接
+# 归档并行扫描引擎（没有索引可用的查询，各分区共用）
+scan_engine = ScanEngine(SCAN_WORKERS)
+
+# 查询结果缓存（分页、搜索、字段过滤；缓存键以分区名开头）
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
+
+# 预编码片段缓存（消息JSON、摘要JSON、Dashboard消息行）
+fragment_cache = FragmentCache(FRAGMENT_CACHE_ENTRIES)
+
+def invalidate_store_results(store):
+    """分区数据变化时只清除该分区的查询结果缓存"""
+    result_cache.invalidate(store.name)
 
-def broadcast_new_message(message):
-    """广播新消息给所有连接的客户端"""
+# 实时推送事件广播（每个SSE连接独立读取，短时间内的事件合并为一帧）
+event_broadcaster = EventBroadcaster(buffer_size=SSE_BUFFER_EVENTS, window=SSE_COALESCE_WINDOW_MS / 1000,
+                                     max_batch=SSE_MAX_BATCH)
+
+# 统计增量推送（每个来源最多每 SSE_STATS_INTERVAL_MS 毫秒一个stats事件）
+stats_publisher = StatsDeltaPublisher(event_broadcaster, interval=SSE_STATS_INTERVAL_MS / 1000)
+
+def publish_store_stats(store, delta):
+    """分区统计变化时推送增量"""
+    stats_publisher.add(store.name, delta)
+
+# 默认存储分区（/webhook）
+# 以 python app.py 启动时，扫描工作进程会以 __mp_main__ 重新执行本模块，工作进程只需要扫描函数，不加载存储
+if __name__ == '__mp_main__':
+    default_store = None
+else:
+    default_store = MessageStore('', MESSAGES_FILE, ARCHIVE_DIR,
+                                 indexed_fields=webhook_settings.get('indexed_fields', []),
+                                 retention_days=webhook_settings.get('retention_days', 0),
+                                 on_change=invalidate_store_results,
+                                 on_stats=publish_store_stats)
+
+# 命名来源的存储分区（第一次访问时加载）
+source_stores = {}
+source_stores_lock = threading.Lock()
+
+def get_source_settings(source):
+    """获取来源的接收设置（默认来源使用全局设置），未配置的来源返回None"""
+    if not source:
+        return webhook_settings
+    return webhook_settings.get('sources', {}).get(source)
+
+def get_store(source=''):
+    """获取来源的存储分区，未配置的来源返回None"""
+    if not source:
+        return default_store
+    source_settings = get_source_settings(source)
+    if source_settings is None:
+        return None
+    with source_stores_lock:
+        store = source_stores.get(source)
+        if store is None:
+            source_dir = SOURCES_DIR / source
+            store = MessageStore(source, source_dir / 'messages.json', source_dir / 'archive',
+                                 indexed_fields=webhook_settings.get('indexed_fields', []),
+                                 retention_days=source_settings.get('retention_days', 0),
+                                 on_change=invalidate_store_results,
+                                 on_stats=publish_store_stats)
+            source_stores[source] = store
+        return store
+
+def request_store():
+    """当前请求的 ?source= 参数对应的存储分区"""
+    return get_store(request.args.get('source', '').strip())
+
+def broadcast_new_message(store, message):
+    """广播新消息给所有连接的客户端（事件中带有来源名，Dashboard只显示当前来源的消息）"""
     try:
-        # 将消息放入队列
-        message_data = {
-            'type': 'new_message',
-            'data': message
-        }
-        message_queue.put(json.dumps(message_data))
-        print(f"广播新消息: ID {message['id']}")
+        # 发布到事件缓冲区（直接拼接消息记录的JSON字节）
+        event_broadcaster.publish(store.name, '{"type": "new_message", "source": ' + json.dumps(store.name or None) +
+                                  ', "data": ' + message.to_json().decode('utf-8') + '}')
+        print(f"广播新消息: ID {message['id']} [{store.label}]")
     except Exception as e:
         print(f"广播消息失败: {e}")
 
-def verify_webhook_signature(payload, signature, secret):
-    """验证Webhook签名"""
-    if not signature:
-        return False
-    
-    expected_signature = hmac.new(
-        secret.encode('utf-8'), 
-        payload, 
-        hashlib.sha256
-    ).hexdigest()
-    
-    # 支持GitHub风格的签名格式 sha256=xxxxx
-    if signature.startswith('sha256='):
-        signature = signature[7:]
-    
-    return hmac.compare_digest(expected_signature, signature)
+# 签名验证器（按密钥组合缓存，密钥和算法的HMAC初始状态只计算一次）
+signature_verifiers = {}
+signature_verifiers_lock = threading.Lock()
+
+def get_signature_verifier(secret_setting):
+    """获取密钥设置（每行一个密钥）对应的签名验证器"""
+    secrets = tuple(split_secrets(secret_setting))
+    with signature_verifiers_lock:
+        verifier = signature_verifiers.get(secrets)
+        if verifier is None:
+            if len(signature_verifiers) >= 64:
+                # 密钥被多次修改后丢弃旧的验证器
+                signature_verifiers.clear()
+            verifier = SignatureVerifier(secrets, SIGNATURE_HEADERS)
+            signature_verifiers[secrets] = verifier
+        return verifier
 
 @app.route('/')
 def index():
@@ -317,25 +643,57 @@ def logout():
 
 @app.route('/dashboard')
 def dashboard():
-    """消息dashboard"""
-    global webhook_messages
-    
+    """消息dashboard（?source= 查看命名来源的消息）"""
     if 'logged_in' not in session:
         return redirect(url_for('login'))
     
+    source = request.args.get('source', '').strip()
+    store = get_store(source)
+    if store is None:
+        flash(f'未配置的来源: {source}', 'error')
+        return redirect(url_for('dashboard'))
+    
     # 获取分页参数
     page = request.args.get('page', 1, type=int)
     include_archived = request.args.get('archived', 'false').lower() == 'true'
+    time_from = request.args.get('from', '')
+    time_to = request.args.get('to', '')
+    
+    try:
+        start_key, end_key = parse_time_range(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('dashboard', source=source or None,
+                                archived='true' if include_archived else None))
     
     # 获取分页数据
-    result = get_paginated_messages(page=page, include_archived=include_archived)
+    result = get_paginated_messages(store, page=page, include_archived=include_archived,
+                                    start_key=start_key, end_key=end_key)
+    
+    # 分页链接需要保留的查询参数
+    page_query = ''.join([
+        f'&source={quote(source)}' if source else '',
+        '&archived=true' if include_archived else '',
+        f'&from={quote(time_from)}' if time_from else '',
+        f'&to={quote(time_to)}' if time_to else ''
+    ])
+    
+    # 统计和归档信息只列出一次归档文件（同时同步归档清单），消息行和归档信息使用缓存的片段
+    stats = store.stats()
     
     return render_template('dashboard.html', 
-                         messages=result['messages'],
+                         message_rows=[render_message_row(store, msg) for msg in result['messages']],
+                         latest_id=max((msg['id'] for msg in result['messages']), default=0),
                          pagination=result['pagination'],
                          include_archived=include_archived,
-                         message_count=len(webhook_messages),
-                         archived_files=get_archived_files())
+                         time_from=time_from,
+                         time_to=time_to,
+                         page_query=page_query,
+                         source=source,
+                         sources=sorted(webhook_settings.get('sources', {})),
+                         message_count=stats['active_messages'],
+                         stats=stats,
+                         archived_info=render_archived_info(store, stats['archived_files']))
 
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
@@ -343,149 +701,377 @@ def settings():
     if 'logged_in' not in session:
         return redirect(url_for('login'))
     
+    sources_text = json.dumps(webhook_settings.get('sources', {}), ensure_ascii=False, indent=2)
+    
     if request.method == 'POST':
-        webhook_settings['secret'] = request.form.get('secret', '')
+        sources_text = request.form.get('sources', '')
+        try:
+            sources = parse_sources(sources_text)
+            retention_days = max(0, int(request.form.get('retention_days') or 0))
+        except ValueError as e:
+            flash(f'来源配置无效: {e}', 'error')
+            return render_template('settings.html', settings=webhook_settings, sources_text=sources_text)
+        
+        webhook_settings['secret'] = '\n'.join(split_secrets(request.form.get('secret', '')))
         webhook_settings['enabled'] = 'enabled' in request.form
         webhook_settings['event_filter'] = request.form.get('event_filter', '')
+        webhook_settings['retention_days'] = retention_days
+        webhook_settings['sources'] = sources
+        default_store.retention_days = retention_days
+        with source_stores_lock:
+            for name, store in source_stores.items():
+                if name in sources:
+                    store.retention_days = sources[name]['retention_days']
+        
+        indexed_fields = [line.strip() for line in request.form.get('indexed_fields', '').splitlines()
+                          if line.strip()]
+        if indexed_fields != webhook_settings['indexed_fields']:
+            webhook_settings['indexed_fields'] = indexed_fields
+            with source_stores_lock:
+                stores = [default_store] + list(source_stores.values())
+            for store in stores:
+                store.set_indexed_fields(indexed_fields)
         
         # 保存设置到文件
         if save_settings(webhook_settings):
             flash('设置已保存！', 'success')
         else:
             flash('保存设置失败！', 'error')
+        sources_text = json.dumps(sources, ensure_ascii=False, indent=2)
     
-    return render_template('settings.html', settings=webhook_settings)
+    return render_template('settings.html', settings=webhook_settings, sources_text=sources_text)
 
 @app.route('/webhook', methods=['POST'])
-def webhook_endpoint():
-    """Webhook接收端点"""
-    global webhook_messages
-    
-    if not webhook_settings['enabled']:
+@app.route('/webhook/<source>', methods=['POST'])
+def webhook_endpoint(source=''):
+    """Webhook接收端点（/webhook/<source> 使用该来源的密钥和过滤器，写入该来源的存储分区）"""
+    source_settings = get_source_settings(source)
+    if source_settings is None:
+        return jsonify({'error': 'Unknown source'}), 404
+    if not webhook_settings['enabled'] or not source_settings.get('enabled', True):
         return jsonify({'error': 'Webhook disabled'}), 403
     
-    # 获取原始数据
-    payload = request.get_data()
-    signature = request.headers.get('X-Hub-Signature-256') or request.headers.get('X-Signature')
+    event_filter = source_settings.get('event_filter', '')
     
-    # 验证签名（如果设置了secret）
-    if webhook_settings['secret']:
-        if not verify_webhook_signature(payload, signature, webhook_settings['secret']):
+    # 设置了密钥时验证签名（可以配置多个同时有效的密钥，检查所有配置的签名头部）
+    verifier = get_signature_verifier(source_settings.get('secret', '')) if ENABLE_SIGNATURE_VERIFICATION else None
+    signatures = verifier.extract(request.headers) if verifier else []
+    
+    # 读取请求体之前拒绝过大或缺少签名的请求
+    if MAX_WEBHOOK_BODY_SIZE and (request.content_length or 0) > MAX_WEBHOOK_BODY_SIZE:
+        return jsonify({'error': 'Payload too large'}), 413
+    if verifier and not signatures:
+        return jsonify({'error': 'Missing signature'}), 401
+    
+    # 按块读取请求体并增量计算签名，较大的请求体暂存到临时文件，验证通过后才解析
+    try:
+        body = WebhookBody(request.stream, max_size=MAX_WEBHOOK_BODY_SIZE, spill_size=WEBHOOK_SPILL_SIZE,
+                           signature_check=verifier.start(signatures) if verifier else None)
+    except BodyTooLarge:
+        return jsonify({'error': 'Payload too large'}), 413
+    with body:
+        if verifier and not body.verify():
             return jsonify({'error': 'Invalid signature'}), 401
+        return receive_webhook_body(body, source, event_filter)
+
+def receive_webhook_body(body, source, event_filter):
+    """
+    解析已验证的请求体并写入存储分区
+    内存中的请求体只解析一次，原始字节直接作为data保存；写入临时文件的大请求体由JSON解析器从文件读取，
+    解析后重新编码（不再另外读出一份原始字节）。JSON解析仍需要完整的文档，大请求体解析后的数据依然全部在内存中。
+    """
+    payload = None if body.spilled else body.read()
+    store = get_store(source)
     
     try:
-        # 解析JSON数据
-        data = request.get_json() or {}
+        # 非JSON请求体和空请求体抛出异常，按错误消息保存解码后的原始内容（与 request.get_json() 的行为一致）
+        if not request.is_json:
+            request.on_json_loading_failed(None)
+        raw = None
+        if body.spilled:
+            body.file.seek(0)
+            data = json.load(body.file)
+        else:
+            data = json.loads(payload)
+            raw = compact_payload(payload) if data else None
+        if not data:
+            data = {}
+        if raw is None:
+            raw = encode_data(data)
+        
+        event_type = (data.get('event', '') if isinstance(data, dict) else '') \
+            or request.headers.get('X-Event-Type', '')
         
         # 事件过滤（如果设置了过滤器）
-        if webhook_settings['event_filter']:
-            event_type = data.get('event', '') or request.headers.get('X-Event-Type', '')
-            if webhook_settings['event_filter'] not in event_type:
+        if event_filter:
+            if event_filter not in event_type:
                 return jsonify({'message': 'Event filtered'}), 200
         
-        # 生成唯一ID（考虑所有消息包括归档的）
-        message_id = get_next_message_id()
-        
-        # 保存消息（只保存data数据，不保存请求头）
-        message = {
-            'id': message_id,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'data': data,
-            'source_ip': request.remote_addr
-        }
-        
-        webhook_messages.insert(0, message)  # 最新消息在前
-        
-        # 使用配置文件中的限制数量，而不是硬编码的1000
-        if len(webhook_messages) > MAX_ACTIVE_MESSAGES:
-            webhook_messages.pop()
-        
-        # 保存到文件
-        save_messages(webhook_messages)
+        # 分配ID和写入在分区写入锁内完成，不同来源的写入互不阻塞
+        with store.lock:
+            # 生成唯一ID（考虑分区内所有消息包括归档的）
+            message_id = store.next_message_id()
+            
+            # 保存消息（只保存data数据，不保存请求头）
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            message = MessageRecord(message_id, parse_timestamp(timestamp), raw,
+                                    source_ip=request.remote_addr, data=data)
+            
+            # 建立索引、加入活跃消息并保存到文件
+            message = store.add_message(message, event_type=event_type, size=body.size)
         
         # 实时推送新消息
-        broadcast_new_message(message)
+        broadcast_new_message(store, message)
         
         return jsonify({'message': 'Webhook received successfully', 'id': message['id']}), 200
         
     except Exception as e:
-        # 生成唯一ID（考虑所有消息包括归档的）
-        error_id = get_next_message_id()
-        
-        error_message = {
-            'id': error_id,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'error': str(e),
-            'data': payload.decode('utf-8', errors='ignore'),
-            'source_ip': request.remote_addr
-        }
-        webhook_messages.insert(0, error_message)
-        
-        # 保存到文件
-        save_messages(webhook_messages)
+        if payload is None:
+            payload = body.read()
+        with store.lock:
+            # 生成唯一ID（考虑分区内所有消息包括归档的）
+            error_id = store.next_message_id()
+            
+            error_message = store.add_message({
+                'id': error_id,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'error': str(e),
+                'data': payload.decode('utf-8', errors='ignore'),
+                'source_ip': request.remote_addr
+            }, size=body.size)
         
         # 实时推送错误消息
-        broadcast_new_message(error_message)
+        broadcast_new_message(store, error_message)
         
         return jsonify({'error': 'Failed to process webhook', 'details': str(e)}), 400
 
+def unknown_source_response():
+    return jsonify({'error': 'Unknown source'}), 404
+
 @app.route('/api/messages')
 def api_messages():
     """API接口获取消息（AJAX用）"""
     if 'logged_in' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    # 获取分页参数
-    page = request.args.get('page', 1, type=int)
-    include_archived = request.args.get('archived', 'false').lower() == 'true'
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
     
-    # 获取分页数据
-    result = get_paginated_messages(page=page, include_archived=include_archived)
+    # 数据未变化时直接返回304，不读取存储
+    snapshot = store.snapshot()
+    not_modified = not_modified_response(snapshot)
+    if not_modified:
+        return not_modified
+    
+    # 摘要模式：只返回消息摘要，完整数据通过 /api/messages/<id> 获取
+    summary_view = request.args.get('view', 'full') == 'summary'
+    
+    # 增量轮询：只返回比since_id更新的消息
+    since_id = request.args.get('since_id', type=int)
+    field_filters = get_field_filters(request.args)
+    if since_id is not None:
+        limit = request.args.get('limit', PAGE_SIZE, type=int)
+        result = get_messages_since(store, since_id, limit=max(1, limit))
+    elif field_filters:
+        # 字段过滤：如 ?data.action=opened&data.repository.full_name=org/repo
+        page = request.args.get('page', 1, type=int)
+        include_archived = request.args.get('archived', 'false').lower() == 'true'
+        result = filter_messages(store, field_filters, page=page, include_archived=include_archived)
+    else:
+        # 获取分页参数
+        page = request.args.get('page', 1, type=int)
+        include_archived = request.args.get('archived', 'false').lower() == 'true'
+        try:
+            start_key, end_key = parse_time_range(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 获取分页数据
+        result = get_paginated_messages(store, page=page, include_archived=include_archived,
+                                        start_key=start_key, end_key=end_key)
+    
+    # 拼接预编码的消息片段
+    encode = encode_summary if summary_view else encode_message
+    response = messages_json_response(result, [encode(store, msg) for msg in result['messages']])
+    return apply_cache_headers(response, snapshot)
+
+@app.route('/api/messages/<int:message_id>')
+def api_message_detail(message_id):
+    """API接口获取单条消息的完整数据"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    snapshot = store.snapshot()
+    not_modified = not_modified_response(snapshot)
+    if not_modified:
+        return not_modified
+    
+    message = store.get_message_by_id(message_id)
+    if message is None:
+        return jsonify({'error': 'Message not found'}), 404
+    
+    if message.get('data_spilled'):
+        response = spilled_message_response(store, message)
+        if response is None:
+            return jsonify({'error': 'Payload not found'}), 404
+        return apply_cache_headers(response, snapshot)
+    return apply_cache_headers(jsonify(message), snapshot)
+
+@app.route('/api/messages/<int:message_id>/data')
+def api_message_data(message_id):
+    """API接口只获取单条消息的data（转存的payload直接返回blob文件）"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    snapshot = store.snapshot()
+    message = store.get_message_by_id(message_id)
+    if message is None:
+        return jsonify({'error': 'Message not found'}), 404
+    
+    spilled = message.get('data_spilled')
+    if not spilled:
+        return apply_cache_headers(jsonify(message['data']), snapshot)
+    path = store.blobs.path(spilled['ref'])
+    if not path.exists():
+        return jsonify({'error': 'Payload not found'}), 404
+    # blob内容不可变，可以使用文件本身的条件请求和范围请求
+    return send_file(path, mimetype='application/json', conditional=True, max_age=0)
+
+@app.route('/api/search')
+def api_search():
+    """API接口全文搜索消息（按相关度排序，返回消息摘要）"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    snapshot = store.snapshot()
+    not_modified = not_modified_response(snapshot)
+    if not_modified:
+        return not_modified
+    
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    include_archived = request.args.get('archived', 'true').lower() == 'true'
     
-    return jsonify(result)
+    result = search_messages(store, query, page=page, include_archived=include_archived)
+    return apply_cache_headers(jsonify(result), snapshot)
+
+@app.route('/api/scan')
+def api_scan():
+    """
+    流式扫描消息（NDJSON，每行一条结果，从新到旧），用于没有索引可用的查询
+    参数: data.*字段过滤、q关键词、from/to时间范围、fields投影字段（逗号分隔）、limit最大条数、archived、source
+    """
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    try:
+        start_key, end_key = parse_time_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    fields = [path.strip() for path in request.args.get('fields', '').split(',') if path.strip()]
+    limit = request.args.get('limit', 1000, type=int)
+    include_archived = request.args.get('archived', 'true').lower() == 'true'
+    spec = build_spec(get_field_filters(request.args), request.args.get('q', ''), start_key, end_key, fields)
+    
+    # 只扫描时间范围重叠的归档文件
+    paths = []
+    if include_archived:
+        archived_files = store.get_archived_files()
+        manifest_entries = store.refresh_manifest(archived_files)
+        paths = [info['file'] for info in archived_files
+                 if Manifest.overlaps(manifest_entries.get(Path(info['file']).name, {'count': 0}),
+                                      start_key, end_key)]
+    active_messages = sorted(store.messages, key=lambda x: x['timestamp'], reverse=True)
+    active_results = scan_messages(active_messages, spec)
+    for message in active_messages:
+        message.release()  # 活跃列表中只保留原始字节，命中的完整记录输出时直接拼接
+    
+    def generate():
+        archive_scan = scan_engine.scan(paths, spec)
+        sent = 0
+        try:
+            for batch in chain([active_results], (results for _, results in archive_scan)):
+                for item in batch:
+                    if limit and sent >= limit:
+                        return
+                    if isinstance(item, MessageRecord):
+                        yield item.to_json() + b'\n'
+                    else:
+                        yield (json.dumps(item, ensure_ascii=False, default=json_default) + '\n').encode('utf-8')
+                    sent += 1
+        finally:
+            # 客户端断开或达到limit时取消尚未开始的扫描任务
+            archive_scan.close()
+    
+    return app.response_class(generate(), mimetype='application/x-ndjson',
+                              headers={'Cache-Control': 'no-cache'})
 
 @app.route('/api/stats')
 def api_stats():
-    """API接口获取统计数据"""
+    """API接口获取统计数据（?source= 只统计该来源的分区）"""
     if 'logged_in' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    # 数据未变化时直接返回304，不读取归档文件
+    snapshot = store.snapshot()
+    not_modified = not_modified_response(snapshot)
+    if not_modified:
+        return not_modified
+    
     try:
-        # 获取活跃消息数量
-        active_count = len(webhook_messages)
-        
-        # 获取归档文件数量
-        archived_files = get_archived_files()
-        archived_count = len(archived_files)
-        
-        # 获取归档消息总数
-        total_archived_messages = 0
-        for archive_info in archived_files:
-            try:
-                with open(archive_info['file'], 'r', encoding='utf-8') as f:
-                    archived_messages = json.load(f)
-                    total_archived_messages += len(archived_messages)
-            except Exception as e:
-                print(f"读取归档文件失败: {e}")
-        
-        # 计算总消息数
-        total_messages = active_count + total_archived_messages
-        
-        # 返回统计数据
-        stats = {
-            'total_messages': total_messages,
-            'active_messages': active_count,
-            'archived_messages': total_archived_messages,
-            'archived_files': archived_count,
-            'recent_messages': min(active_count, 24)  # 最近24条最近消息
-        }
-        
-        return jsonify(stats)
+        return apply_cache_headers(jsonify(store.stats()), snapshot)
         
     except Exception as e:
         print(f"获取统计数据失败: {e}")
         return jsonify({'error': 'Failed to get stats'}), 500
 
+@app.route('/api/stats/locks')
+def api_lock_stats():
+    """API接口获取各存储分区写入锁的争用统计（获取次数、等待次数、等待和持有时间）"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    with source_stores_lock:
+        stores = [default_store] + list(source_stores.values())
+    return jsonify({store.label: store.lock.stats() for store in stores})
+
+@app.route('/api/stats/stream')
+def api_stream_stats():
+    """API接口获取实时推送统计（发布的事件数、发送的帧数、批量帧数、gap标记数和统计增量事件数）"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return jsonify(dict(event_broadcaster.stats(), stats_deltas=stats_publisher.stats()))
+
+@app.route('/api/stats/cache')
+def api_cache_stats():
+    """API接口获取查询结果缓存和预编码片段缓存统计（命中、未命中、淘汰）"""
+    if 'logged_in' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return jsonify(dict(result_cache.stats(), fragments=fragment_cache.stats()))
+
 @app.route('/api/stream')
 def message_stream():
     """
@@ -493,17 +1079,21 @@ SSE消息流端点"""
     if 'logged_in' not in session:
         return "Unauthorized", 401
     
+    # ?source= 只推送该来源的事件（参数为空表示默认来源），不带参数时推送所有来源
+    source = request.args.get('source')
+    subscription = event_broadcaster.subscribe(source.strip() if source is not None else None)
+    
     def event_stream():
-        """生成SSE事件流"""
+        """生成SSE事件流（短时间内到达的事件合并为一帧）"""
         while True:
             try:
-                # 阻塞等待新消息，超时30秒发送心跳
-                try:
-                    message_data = message_queue.get(timeout=30)
-                    yield f"data: {message_data}\n\n"
-                except queue.Empty:
+                # 阻塞等待新消息，超时发送心跳
+                frame = subscription.next_frame(timeout=SSE_HEARTBEAT_INTERVAL)
+                if frame is None:
                     # 发送心跳保持连接
                     yield "data: {\"type\": \"heartbeat\"}\n\n"
+                else:
+                    yield f"data: {frame}\n\n"
             except Exception as e:
                 print(f"SSE流错误: {e}")
                 break
@@ -520,15 +1110,18 @@ SSE消息流端点"""
 
 @app.route('/api/clear_messages', methods=['POST'])
 def clear_messages():
-    """清空消息"""
+    """清空消息（?source= 只清空该来源的活跃消息）"""
     if 'logged_in' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    global webhook_messages
-    webhook_messages = []
+    store = request_store()
+    if store is None:
+        return unknown_source_response()
+    
+    fragment_cache.clear()
     
-    # 保存到文件
-    if save_messages(webhook_messages):
+    # 清空活跃消息并保存到文件
+    if store.clear():
         return jsonify({'message': 'Messages cleared'})
     else:
         return jsonify({'error': 'Failed to clear messages'}), 500
@@ -542,6 +1135,7 @@ if __name__ == '__main__':
     print(f"管理员账号: {config.ADMIN_USERNAME}")
     print(f"管理员密码: {config.ADMIN_PASSWORD}")
     print(f"Webhook端点: http://{config.HOST}:{config.PORT}/webhook")
+    print(f"命名来源端点: http://{config.HOST}:{config.PORT}/webhook/<source>")
     print(f"管理界面: http://{config.HOST}:{config.PORT}")
     print(f"配置文件: {config.__class__.__name__}")
     print(f"数据目录: {config.DATA_DIR}")
@@ -0,0 +1,617 @@
+"""
+NDJSON归档段
+每个归档段由两个文件组成：
+  messages_YYYY-MM-DD.ndjson  每行一条紧凑JSON消息（按时间升序）
+  messages_YYYY-MM-DD.idx     定长索引，每条消息16字节（字节偏移 + 时间戳键）
+读取时通过mmap映射文件，只解码分页、导出或查询需要的记录
+
+较旧的归档段会转换为压缩冷归档：
+  messages_YYYY-MM-DD.ndjz    按块独立压缩的NDJSON记录
+  messages_YYYY-MM-DD.bidx    块索引（文件头 + 每块偏移/长度 + 每条消息的时间戳键）
+读取单条记录或一页记录只需解压其所在的块
+
+启用payload去重时，记录中的data可能是对分区blob目录的引用（data_ref），读取时自动替换为data；
+重写归档段（合并、冷归档转换）时保留引用不展开
+
+写入方（持有分区写入锁）追加时先写数据再写索引，重写时先替换索引再替换数据；
+读取方不加锁，只使用索引覆盖的完整记录，索引缺失或不一致时在内存中扫描，不写任何文件
+"""
+import gzip
+import json
+import lzma
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from blob_store import blob_dir_for, resolve_record
+from message_record import parse_timestamp
+
+# 索引条目：记录起始偏移、时间戳键（秒）
+SIDECAR_ENTRY = struct.Struct('<Qq')
+
+SEGMENT_SUFFIX = '.ndjson'
+SIDECAR_SUFFIX = '.idx'
+LEGACY_SUFFIX = '.json'
+COLD_SUFFIX = '.ndjz'
+BLOCK_INDEX_SUFFIX = '.bidx'
+
+# 冷归档块索引：文件头（魔数、压缩算法、每块记录数、块数、记录数）、块条目（偏移、长度）、时间戳键
+COLD_HEADER = struct.Struct('<4sBIII')
+COLD_MAGIC = b'WHC1'
+BLOCK_ENTRY = struct.Struct('<QI')
+TIMESTAMP_ENTRY = struct.Struct('<q')
+
+# 冷归档压缩算法：名称 -> (编号, 压缩函数, 解压函数)
+CODECS = {
+    'zlib': (1, zlib.compress, zlib.decompress),
+    'gzip': (2, gzip.compress, gzip.decompress),
+    'lzma': (3, lzma.compress, lzma.decompress)
+}
+DECOMPRESSORS = {codec_id: decompress for codec_id, _, decompress in CODECS.values()}
+
+
+def timestamp_key(timestamp):
+    """将消息时间字符串转换为可排序的整数秒（按UTC解释，仅用于排序和比较；与活跃消息记录使用同一个解析函数）"""
+    return parse_timestamp(timestamp)
+
+
+def sidecar_path(segment_path):
+    """获取归档段对应的索引文件路径"""
+    return Path(segment_path).with_suffix(SIDECAR_SUFFIX)
+
+
+def encode_record(message):
+    """将消息编码为一行紧凑JSON（活跃消息记录直接使用已编码的字节，去重的payload只写引用）"""
+    if hasattr(message, 'to_stored_json'):
+        return message.to_stored_json() + b'\n'
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def sort_key(message):
+    """归档段内的排序键（时间升序，同一秒内按ID升序）"""
+    return timestamp_key(message['timestamp']), message.get('id', 0)
+
+
+def _write_records(data_file, index_file, messages, position):
+    """写入记录和索引条目，返回每条消息的位置 {id: (offset, length)}"""
+    locations = {}
+    data = bytearray()
+    entries = bytearray()
+    for msg in messages:
+        record = encode_record(msg)
+        offset = position + len(data)
+        entries += SIDECAR_ENTRY.pack(offset, timestamp_key(msg['timestamp']))
+        locations[msg['id']] = (offset, len(record) - 1)
+        data += record
+    data_file.write(data)
+    index_file.write(entries)
+    return locations
+
+
+def write_segment(segment_path, messages):
+    """写入完整归档段（消息需已按时间升序排列），返回消息位置"""
+    segment_path = Path(segment_path)
+    index_path = sidecar_path(segment_path)
+    tmp_segment = segment_path.with_suffix(SEGMENT_SUFFIX + '.tmp')
+    tmp_index = index_path.with_suffix(SIDECAR_SUFFIX + '.tmp')
+
+    with open(tmp_segment, 'wb') as data_file, open(tmp_index, 'wb') as index_file:
+        locations = _write_records(data_file, index_file, messages, 0)
+
+    tmp_index.replace(index_path)
+    tmp_segment.replace(segment_path)
+    return locations
+
+
+def append_segment(segment_path, messages):
+    """向归档段末尾追加消息（消息需比段内已有消息更新），返回新消息位置"""
+    segment_path = Path(segment_path)
+    position = segment_path.stat().st_size if segment_path.exists() else 0
+
+    with open(segment_path, 'ab') as data_file, open(sidecar_path(segment_path), 'ab') as index_file:
+        return _write_records(data_file, index_file, messages, position)
+
+
+def scan_sidecar(data):
+    """按换行符扫描归档段数据，返回 (索引条目, 最后一条完整记录的结束位置)；末尾不完整的行被忽略"""
+    entries = bytearray()
+    position = 0
+    while position < len(data):
+        end = data.find(b'\n', position)
+        if end == -1:
+            break
+        line = data[position:end]
+        if line.strip():
+            entries += SIDECAR_ENTRY.pack(position, timestamp_key(json.loads(line)['timestamp']))
+        position = end + 1
+    return bytes(entries), position
+
+
+def rebuild_sidecar(segment_path):
+    """按换行符扫描归档段，重建索引文件（只由写入方调用）"""
+    segment_path = Path(segment_path)
+    entries, _ = scan_sidecar(segment_path.read_bytes())
+    index_path = sidecar_path(segment_path)
+    tmp_index = index_path.with_suffix(SIDECAR_SUFFIX + '.tmp')
+    tmp_index.write_bytes(entries)
+    tmp_index.replace(index_path)
+
+
+def repair_sidecar(segment_path):
+    """索引文件缺失或与数据不一致时重建（只由写入方调用），返回是否重建"""
+    with Segment(segment_path) as segment:
+        if not segment.rescanned:
+            return False
+    rebuild_sidecar(segment_path)
+    return True
+
+
+class BaseSegment:
+    """只读归档段公共接口，子类需提供 count、timestamp_at、record_bytes、location"""
+
+    count = 0
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def read(self, i, resolve=True):
+        """解码第i条记录（resolve为False时保留data_ref引用）"""
+        message = json.loads(self.record_bytes(i))
+        if resolve and ('data_ref' in message or 'data_spilled' in message):
+            resolve_record(message, blob_dir_for(self.path))
+        return message
+
+    def iter_records(self, resolve=True):
+        """按时间升序遍历所有记录"""
+        for i in range(self.count):
+            yield self.read(i, resolve)
+
+    def iter_keys_desc(self, start=0, stop=None):
+        """按时间降序遍历 [start, stop) 范围内的 (时间戳键, (段, 序号))，用于多段归并而不解码记录"""
+        stop = self.count if stop is None else stop
+        for i in range(stop - 1, start - 1, -1):
+            yield self.timestamp_at(i), (self, i)
+
+    def bisect_left(self, key):
+        """二分查找第一条时间戳键 >= key 的记录序号"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def index_range(self, start_key=None, end_key=None):
+        """时间范围 [start_key, end_key] 内的记录序号范围 (start, stop)"""
+        start = 0 if start_key is None else self.bisect_left(start_key)
+        stop = self.count if end_key is None else self.bisect_left(end_key + 1)
+        return start, max(start, stop)
+
+    def locations(self):
+        """所有记录的位置 {id: location}（需要解码全部记录，仅用于重建索引）"""
+        return {self.read(i, resolve=False)['id']: self.location(i) for i in range(self.count)}
+
+
+class Segment(BaseSegment):
+    """只读NDJSON归档段（mmap映射，按需解码记录）"""
+
+    def __init__(self, segment_path):
+        self.path = Path(segment_path)
+        self.sidecar = sidecar_path(self.path)
+        self._data = None
+        self._index = None
+        self._data_file = None
+        self._index_file = None
+        self.count = 0
+        self.data_end = 0  # 索引覆盖的数据结束位置（之后可能是正在追加的记录）
+        self.rescanned = False  # 索引是否在内存中重新扫描生成
+        self.open()
+
+    def open(self):
+        """映射归档段和索引文件；索引缺失或不一致时在内存中扫描生成索引（不写文件）"""
+        self._data_file = open(self.path, 'rb')
+        data_size = os.fstat(self._data_file.fileno()).st_size
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b''
+        self._index = b''
+        if self.sidecar.exists():
+            self._index_file = open(self.sidecar, 'rb')
+            if os.fstat(self._index_file.fileno()).st_size:
+                self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = len(self._index) // SIDECAR_ENTRY.size
+
+        data_end = self._indexed_end(data_size)
+        if data_end is None or (data_end < data_size and not self.count):
+            self._index, data_end = scan_sidecar(self._data)
+            self.count = len(self._index) // SIDECAR_ENTRY.size
+            self.rescanned = data_end != 0 or data_size != 0
+        elif data_end < data_size and self._data.find(b'\n', data_end) == -1:
+            pass  # 末尾是正在写入的不完整记录
+        elif data_end < data_size:
+            self.rescanned = True  # 索引之后还有完整记录：追加中，或上次追加未写入索引
+        self.data_end = data_end
+
+    def _indexed_end(self, data_size):
+        """索引覆盖的数据结束位置；最后一条索引不指向数据中的完整行时返回None"""
+        if self.count == 0:
+            return 0
+        last_offset = self.offset(self.count - 1)
+        if last_offset >= data_size or (last_offset and self._data[last_offset - 1] != 0x0A):
+            return None
+        end = self._data.find(b'\n', last_offset)
+        return None if end == -1 else end + 1
+
+    def close(self):
+        for mapped in (self._data, self._index):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        for f in (self._data_file, self._index_file):
+            if f:
+                f.close()
+        self._data = self._index = self._data_file = self._index_file = None
+
+    def offset(self, i):
+        return SIDECAR_ENTRY.unpack_from(self._index, i * SIDECAR_ENTRY.size)[0]
+
+    def timestamp_at(self, i):
+        """第i条记录的时间戳键（不解码记录）"""
+        return SIDECAR_ENTRY.unpack_from(self._index, i * SIDECAR_ENTRY.size)[1]
+
+    def record_bytes(self, i):
+        """第i条记录的原始字节（不含换行符）"""
+        start = self.offset(i)
+        end = self.offset(i + 1) if i + 1 < self.count else self.data_end
+        return self._data[start:end - 1]
+
+    def location(self, i):
+        """消息ID索引中的位置：(字节偏移, 记录长度)"""
+        start = self.offset(i)
+        end = self.offset(i + 1) if i + 1 < self.count else self.data_end
+        return start, end - start - 1
+
+
+def cold_paths(segment_path):
+    """获取冷归档数据文件和块索引文件路径"""
+    segment_path = Path(segment_path)
+    return segment_path.with_suffix(COLD_SUFFIX), segment_path.with_suffix(BLOCK_INDEX_SUFFIX)
+
+
+def write_cold_segment(cold_path, messages, codec='zlib', block_records=128):
+    """
+    将消息（已按时间升序排列）写入压缩冷归档，每block_records条记录独立压缩为一块
+    返回消息位置 {id: (记录序号, 0)}
+    """
+    codec_id, compress, _ = CODECS[codec]
+    data_path, index_path = cold_paths(cold_path)
+
+    data = bytearray()
+    blocks = bytearray()
+    timestamps = bytearray()
+    locations = {}
+    for start in range(0, len(messages), block_records):
+        block = b''.join(encode_record(msg) for msg in messages[start:start + block_records])
+        compressed = compress(block)
+        blocks += BLOCK_ENTRY.pack(len(data), len(compressed))
+        data += compressed
+    for i, msg in enumerate(messages):
+        timestamps += TIMESTAMP_ENTRY.pack(timestamp_key(msg['timestamp']))
+        locations[msg['id']] = (i, 0)
+
+    header = COLD_HEADER.pack(COLD_MAGIC, codec_id, block_records,
+                              len(blocks) // BLOCK_ENTRY.size, len(messages))
+    tmp_data = data_path.with_suffix(COLD_SUFFIX + '.tmp')
+    tmp_index = index_path.with_suffix(BLOCK_INDEX_SUFFIX + '.tmp')
+    tmp_data.write_bytes(data)
+    tmp_index.write_bytes(header + blocks + timestamps)
+    tmp_data.replace(data_path)
+    tmp_index.replace(index_path)
+    return locations
+
+
+class ColdSegment(BaseSegment):
+    """只读压缩冷归档段（按块解压，缓存最近解压的一块）"""
+
+    def __init__(self, cold_path):
+        self.path, self.block_index = cold_paths(cold_path)
+        index = self.block_index.read_bytes()
+        magic, codec_id, self.block_records, self.block_count, self.count = COLD_HEADER.unpack_from(index)
+        if magic != COLD_MAGIC:
+            raise ValueError(f"无效的冷归档块索引: {self.block_index}")
+
+        self._decompress = DECOMPRESSORS[codec_id]
+        self._blocks = index[COLD_HEADER.size:COLD_HEADER.size + self.block_count * BLOCK_ENTRY.size]
+        self._timestamps = index[COLD_HEADER.size + len(self._blocks):]
+        self._data_file = open(self.path, 'rb')
+        self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.path.stat().st_size else b''
+        self._cached_block = (None, [])
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._data_file:
+            self._data_file.close()
+        self._data = self._data_file = None
+
+    def _block_records(self, block_no):
+        """解压一块并拆分为记录"""
+        cached_no, records = self._cached_block
+        if cached_no != block_no:
+            offset, length = BLOCK_ENTRY.unpack_from(self._blocks, block_no * BLOCK_ENTRY.size)
+            records = self._decompress(self._data[offset:offset + length]).split(b'\n')[:-1]
+            self._cached_block = (block_no, records)
+        return records
+
+    def timestamp_at(self, i):
+        """第i条记录的时间戳键（不解压数据）"""
+        return TIMESTAMP_ENTRY.unpack_from(self._timestamps, i * TIMESTAMP_ENTRY.size)[0]
+
+    def record_bytes(self, i):
+        """第i条记录的原始字节（只解压所在的块）"""
+        return self._block_records(i // self.block_records)[i % self.block_records]
+
+    def location(self, i):
+        """消息ID索引中的位置：(记录序号, 0)"""
+        return i, 0
+
+
+def open_segment(segment_path):
+    """按文件后缀打开NDJSON归档段或压缩冷归档段"""
+    if Path(segment_path).suffix == COLD_SUFFIX:
+        return ColdSegment(segment_path)
+    return Segment(segment_path)
+
+
+def read_record_at(segment_path, offset, length):
+    """按消息ID索引中的位置读取一条记录"""
+    segment_path = Path(segment_path)
+    if segment_path.suffix == COLD_SUFFIX:
+        with ColdSegment(segment_path) as segment:
+            return segment.read(offset)
+    with open(segment_path, 'rb') as f:
+        f.seek(offset)
+        message = json.loads(f.read(length))
+    if 'data_ref' in message or 'data_spilled' in message:
+        resolve_record(message, blob_dir_for(segment_path))
+    return message
+
+
+def load_legacy_archive(json_path):
+    """读取旧版JSON数组格式的归档文件"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _merge_and_write(segment_path, legacy_path, messages):
+    """
+    合并段内已有消息、同日期的旧版JSON归档和冷归档以及新消息，
+    按ID去重、按时间排序后重写为NDJSON归档段（冷归档会在下次转换时重新压缩）
+    """
+    cold_data, cold_index = cold_paths(segment_path)
+    all_messages = []
+    if segment_path.exists():
+        with Segment(segment_path) as segment:
+            all_messages.extend(segment.iter_records(resolve=False))
+    if cold_data.exists():
+        with ColdSegment(cold_data) as segment:
+            all_messages.extend(segment.iter_records(resolve=False))
+    if legacy_path.exists():
+        all_messages.extend(load_legacy_archive(legacy_path))
+    all_messages.extend(messages)
+
+    unique_messages = {}
+    for msg in all_messages:
+        unique_messages[msg['id']] = msg
+    locations = write_segment(segment_path, sorted(unique_messages.values(), key=sort_key))
+
+    for path in (legacy_path, cold_data, cold_index):
+        if path.exists():
+            path.unlink()
+    return locations
+
+
+def store_archive_messages(archive_dir, date_key, messages):
+    """
+    将消息写入指定日期的归档段，返回 (段文件名, 消息位置)
+    新消息都比段内已有消息更新时直接追加，否则合并去重后重写整个段；
+    同日期的旧版JSON归档会被合并进来并删除
+    """
+    archive_dir = Path(archive_dir)
+    segment_path = archive_dir / f'messages_{date_key}{SEGMENT_SUFFIX}'
+    legacy_path = archive_dir / f'messages_{date_key}{LEGACY_SUFFIX}'
+    new_messages = sorted(messages, key=sort_key)
+
+    if new_messages and segment_path.exists() and not legacy_path.exists() \
+            and not cold_paths(segment_path)[0].exists():
+        repair_sidecar(segment_path)
+        with Segment(segment_path) as segment:
+            can_append = segment.count == 0 or (
+                segment.timestamp_at(segment.count - 1) <= timestamp_key(new_messages[0]['timestamp'])
+                and segment.read(segment.count - 1, resolve=False)['id'] < min(msg['id'] for msg in new_messages))
+        if can_append:
+            return segment_path.name, append_segment(segment_path, new_messages)
+
+    return segment_path.name, _merge_and_write(segment_path, legacy_path, new_messages)
+
+
+def migrate_legacy_archive(json_path):
+    """将旧版JSON数组归档转换为NDJSON归档段，返回 (段文件名, 消息位置)"""
+    json_path = Path(json_path)
+    date_key = json_path.stem.replace('messages_', '')
+    return store_archive_messages(json_path.parent, date_key, [])
+
+
+def segment_date(segment_path):
+    """从归档文件名中解析日期"""
+    return datetime.strptime(Path(segment_path).stem.replace('messages_', ''), '%Y-%m-%d').date()
+
+
+def convert_to_cold(segment_path, codec='zlib', block_records=128):
+    """将NDJSON归档段（或旧版JSON归档）转换为压缩冷归档，返回 (冷归档文件名, 消息位置)"""
+    segment_path = Path(segment_path)
+    if segment_path.suffix == LEGACY_SUFFIX:
+        messages = sorted(load_legacy_archive(segment_path), key=sort_key)
+    else:
+        with Segment(segment_path) as segment:
+            messages = list(segment.iter_records(resolve=False))
+
+    cold_data, _ = cold_paths(segment_path)
+    locations = write_cold_segment(cold_data, messages, codec=codec, block_records=block_records)
+
+    for path in (segment_path, sidecar_path(segment_path)):
+        if path.exists():
+            path.unlink()
+    return cold_data.name, locations
+
+
+def find_cold_candidates(archive_dir, older_than_days):
+    """查找日期早于指定天数、尚未压缩的归档文件"""
+    cutoff = datetime.now().date() - timedelta(days=older_than_days)
+    candidates = []
+    for path in sorted(Path(archive_dir).glob('messages_*')):
+        if path.suffix not in (SEGMENT_SUFFIX, LEGACY_SUFFIX):
+            continue
+        try:
+            if segment_date(path) < cutoff:
+                candidates.append(path)
+        except ValueError:
+            continue
+    return candidates
+
+
+
+def find_expired_archives(archive_dir, retention_days):
+    """查找日期早于保留天数的归档文件（NDJSON归档段、压缩冷归档和旧版JSON归档）"""
+    cutoff = datetime.now().date() - timedelta(days=retention_days)
+    expired = []
+    for path in sorted(Path(archive_dir).glob('messages_*')):
+        if path.suffix not in (SEGMENT_SUFFIX, COLD_SUFFIX, LEGACY_SUFFIX):
+            continue
+        try:
+            if segment_date(path) < cutoff:
+                expired.append(path)
+        except ValueError:
+            continue
+    return expired
+
+
+def remove_archive(archive_path):
+    """删除归档文件及其偏移索引（NDJSON归档段的 .idx、冷归档的 .bidx）"""
+    archive_path = Path(archive_path)
+    for path in (archive_path, sidecar_path(archive_path), archive_path.with_suffix(BLOCK_INDEX_SUFFIX)):
+        if path.exists():
+            path.unlink()
+
+
+def archive_refs(archive_path):
+    """归档文件中记录引用的blob哈希（去重和转存的payload；只解码包含引用的记录，旧版JSON归档没有引用）"""
+    archive_path = Path(archive_path)
+    if archive_path.suffix == LEGACY_SUFFIX:
+        return []
+    refs = []
+    with open_segment(archive_path) as segment:
+        for i in range(segment.count):
+            record = segment.record_bytes(i)
+            if b'"data_ref":' in record or b'"data_spilled":' in record:
+                message = segment.read(i, resolve=False)
+                if 'data_ref' in message:
+                    refs.append(message['data_ref'])
+                elif isinstance(message.get('data_spilled'), dict):
+                    refs.append(message['data_spilled']['ref'])
+    return refs
+
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+
+class Manifest:
+    """
+    归档清单：记录每个归档文件的消息数和时间范围，用于时间范围查询时跳过无关的归档段。
+    文件大小或修改时间变化时自动重新统计；内容变化时版本号递增。
+    """
+
+    def __init__(self, archive_dir):
+        self.path = Path(archive_dir) / MANIFEST_FILE_NAME
+        self.version = 0
+        self.segments = {}
+        self.lock = threading.Lock()  # 查询和写入都会同步清单
+        try:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.version = data.get('version', 0)
+                self.segments = data.get('segments', {})
+        except Exception as e:
+            print(f"加载归档清单失败: {e}")
+
+    def save(self):
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'segments': self.segments}, f, ensure_ascii=False)
+        tmp_path.replace(self.path)
+
+    @staticmethod
+    def describe(segment_path):
+        """统计归档文件的消息数和时间范围"""
+        segment_path = Path(segment_path)
+        if segment_path.suffix == LEGACY_SUFFIX:
+            keys = [timestamp_key(msg['timestamp']) for msg in load_legacy_archive(segment_path)]
+            return {'count': len(keys), 'min_ts': min(keys, default=None), 'max_ts': max(keys, default=None)}
+        with open_segment(segment_path) as segment:
+            if not segment.count:
+                return {'count': 0, 'min_ts': None, 'max_ts': None}
+            return {'count': segment.count, 'min_ts': segment.timestamp_at(0),
+                    'max_ts': segment.timestamp_at(segment.count - 1)}
+
+    def refresh(self, segment_paths):
+        """与当前归档文件同步，返回 {文件名: 清单条目}（无法统计的文件条目带有error，消息数为0）"""
+        with self.lock:
+            changed = False
+            current = {}
+            for segment_path in map(Path, segment_paths):
+                try:
+                    stat = segment_path.stat()
+                except FileNotFoundError:
+                    continue  # 列出后被转换或删除的归档文件
+                entry = self.segments.get(segment_path.name)
+                if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+                    try:
+                        description = self.describe(segment_path)
+                    except Exception as e:
+                        # 无法读取的归档文件（如记录时间格式错误）记为空段，查询时跳过；文件变化后重新统计
+                        print(f"统计归档文件失败，已跳过 {segment_path.name}: {e}")
+                        description = {'count': 0, 'min_ts': None, 'max_ts': None, 'error': str(e)}
+                    entry = dict(description, size=stat.st_size, mtime=stat.st_mtime_ns)
+                    changed = True
+                current[segment_path.name] = entry
+
+            if changed or current.keys() != self.segments.keys():
+                self.segments = current
+                self.version += 1
+                self.save()
+            return current
+
+    @staticmethod
+    def overlaps(entry, start_key=None, end_key=None):
+        """清单条目的时间范围是否与查询范围重叠"""
+        if not entry['count']:
+            return False
+        if start_key is not None and entry['max_ts'] < start_key:
+            return False
+        if end_key is not None and entry['min_ts'] > end_key:
+            return False
+        return True
@@ -0,0 +1,220 @@
+"""
+内容寻址的payload存储
+相同的data字节只保存一次：文件名为内容的SHA-256，消息中只记录引用（data_ref）。
+每个存储分区有自己的 blobs/ 目录（与 messages.json、archive/ 同级），
+引用计数：接收消息时加一，活跃消息被清空/丢弃或归档文件按保留期限删除时减一，计数归零时删除blob文件；
+消息归档、冷归档转换时引用保持不变。每次变化只向 blobs/refs.log 追加一行（序号 哈希 增量），
+存储分区重写快照或日志达到压缩间隔时才把全部计数写入 blobs/refs.json 并清空日志；
+refs.json 记录已包含的最后序号，启动时只重放序号更大的日志行（压缩中途退出也不会重复计数）。
+超过大小阈值的payload也写入这里（data_spilled），读取消息时不加载，只在请求完整数据时按块流式读取。
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+BLOB_DIR_NAME = 'blobs'
+REFS_FILE_NAME = 'refs.json'
+REFS_LOG_NAME = 'refs.log'
+BLOB_SUFFIX = '.json'
+
+
+def blob_dir_for(archive_path):
+    """归档文件所在分区的blob目录（分区目录/blobs）"""
+    return Path(archive_path).parent.parent / BLOB_DIR_NAME
+
+
+def blob_path(blob_dir, digest):
+    """blob文件路径（按哈希前两位分子目录）"""
+    return Path(blob_dir) / digest[:2] / (digest + BLOB_SUFFIX)
+
+
+@lru_cache(maxsize=256)
+def _read_blob(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_blob(blob_dir, digest):
+    """读取blob内容（blob不可变，按路径缓存最近读取的内容）"""
+    return _read_blob(str(blob_path(blob_dir, digest)))
+
+
+def iter_blob(blob_dir, digest, chunk_size=64 * 1024):
+    """按块读取blob内容（用于流式返回转存的大payload，不整体读入内存）"""
+    with open(blob_path(blob_dir, digest), 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def resolve_record(message, blob_dir):
+    """将归档记录中的data_ref替换为data；转存的payload不加载，data为null（没有引用的记录原样返回）"""
+    digest = message.pop('data_ref', None)
+    if digest is not None:
+        message['data'] = json.loads(read_blob(blob_dir, digest))
+    elif 'data_spilled' in message:
+        message.setdefault('data', None)
+    return message
+
+
+class BlobStore:
+    """一个分区的内容寻址blob存储（带引用计数）"""
+
+    def __init__(self, blob_dir, min_size=0, cache_entries=1024, compact_interval=1000):
+        self.blob_dir = Path(blob_dir)
+        self.refs_file = self.blob_dir / REFS_FILE_NAME
+        self.log_file = self.blob_dir / REFS_LOG_NAME
+        self.min_size = min_size
+        self.cache_entries = cache_entries
+        self.compact_interval = max(1, compact_interval)
+        self.refs = {}
+        self.seq = 0          # 最后一次引用变化的序号
+        self.log_entries = 0  # 日志中尚未压缩的行数
+        self.cache = OrderedDict()  # 哈希 -> 内容（相同payload的活跃消息共用同一个bytes对象）
+        self.lock = threading.Lock()
+        try:
+            if self.refs_file.exists():
+                with open(self.refs_file, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                if isinstance(saved.get('refs'), dict):
+                    self.refs, self.seq = saved['refs'], saved.get('seq', 0)
+                else:
+                    # 旧版本的格式：{哈希: 计数}
+                    self.refs = saved
+        except Exception as e:
+            print(f"加载blob引用计数失败: {e}")
+        if not self._replay_log():
+            # 日志末尾有未写完的行：立即压缩，之后的记录不会追加在残缺行之后
+            with self.lock:
+                self._compact()
+
+    def _replay_log(self):
+        """重放refs.json之后的引用变化，返回日志是否完整"""
+        if not self.log_file.exists():
+            return True
+        try:
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        return False
+                    seq, digest, delta = line.split()
+                    seq = int(seq)
+                    self.log_entries += 1
+                    if seq <= self.seq:
+                        continue
+                    self.seq = seq
+                    digest = digest.decode('ascii')
+                    count = self.refs.get(digest, 0) + int(delta)
+                    if count > 0:
+                        self.refs[digest] = count
+                    else:
+                        self.refs.pop(digest, None)
+        except Exception as e:
+            print(f"重放blob引用日志失败: {e}")
+            return False
+        return True
+
+    def _log_changes(self, changes):
+        """追加引用变化 [(哈希, 增量)]（需要持有锁），日志达到压缩间隔时压缩"""
+        lines = []
+        for digest, delta in changes:
+            self.seq += 1
+            lines.append(f'{self.seq} {digest} {delta:+d}\n')
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.log_file, 'a', encoding='ascii') as f:
+            f.write(''.join(lines))
+        self.log_entries += len(lines)
+        if self.log_entries >= self.compact_interval:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.refs_file.with_suffix('.tmp')
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'seq': self.seq, 'refs': self.refs}, f)
+        tmp_path.replace(self.refs_file)
+        with open(self.log_file, 'wb'):
+            pass
+        self.log_entries = 0
+
+    def compact(self):
+        """把全部引用计数写入refs.json并清空日志（存储分区重写快照时调用）"""
+        with self.lock:
+            if self.log_entries:
+                self._compact()
+
+    def _remember(self, digest, raw):
+        """缓存内容，已缓存时返回缓存中的对象"""
+        cached = self.cache.get(digest)
+        if cached is not None:
+            self.cache.move_to_end(digest)
+            return cached
+        self.cache[digest] = raw
+        while len(self.cache) > self.cache_entries:
+            self.cache.popitem(last=False)
+        return raw
+
+    def accepts(self, raw):
+        """payload是否需要去重（小于min_size的payload直接内联保存）"""
+        return len(raw) >= self.min_size
+
+    def put(self, raw, remember=True):
+        """保存payload并增加引用，返回 (哈希, 共享的内容对象)；remember为False时不缓存内容（转存的大payload）"""
+        digest = hashlib.sha256(raw).hexdigest()
+        with self.lock:
+            if digest not in self.refs:
+                path = blob_path(self.blob_dir, digest)
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_suffix('.tmp')
+                    tmp_path.write_bytes(raw)
+                    tmp_path.replace(path)
+            self.refs[digest] = self.refs.get(digest, 0) + 1
+            self._log_changes([(digest, 1)])
+            return digest, self._remember(digest, raw) if remember else raw
+
+    def path(self, digest):
+        return blob_path(self.blob_dir, digest)
+
+    def get(self, digest):
+        """读取payload内容"""
+        with self.lock:
+            cached = self.cache.get(digest)
+            if cached is not None:
+                self.cache.move_to_end(digest)
+                return cached
+        raw = read_blob(self.blob_dir, digest)
+        with self.lock:
+            return self._remember(digest, raw)
+
+    def release(self, digests):
+        """减少引用，计数归零的blob被删除（先记录引用变化再删除文件）"""
+        with self.lock:
+            changes = []
+            removed = []
+            for digest in digests:
+                count = self.refs.get(digest)
+                if count is None:
+                    continue
+                changes.append((digest, -1))
+                if count > 1:
+                    self.refs[digest] = count - 1
+                    continue
+                del self.refs[digest]
+                self.cache.pop(digest, None)
+                removed.append(digest)
+            if changes:
+                self._log_changes(changes)
+            for digest in removed:
+                path = blob_path(self.blob_dir, digest)
+                if path.exists():
+                    path.unlink()
+
+    def stats(self):
+        with self.lock:
+            return {'blobs': len(self.refs), 'references': sum(self.refs.values())}
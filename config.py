@@ -50,6 +50,11 @@ class Config:
     def ARCHIVE_DIR(self):
         return self.DATA_DIR / 'archive'
     
+    # 命名来源存储目录（每个来源一个子目录，包含独立的messages.json和archive）
+    @property
+    def SOURCES_DIR(self):
+        return self.DATA_DIR / 'sources'
+    
     # ==================== 存储限制配置 ====================
     # 每个文件最大消息数
     MAX_MESSAGES_PER_FILE = int(os.environ.get('MAX_MESSAGES_PER_FILE', 500))
@@ -57,9 +62,51 @@ class Config:
     # 活跃消息最大数（超过后自动归档）
     MAX_ACTIVE_MESSAGES = int(os.environ.get('MAX_ACTIVE_MESSAGES', 1000))
     
+    # 是否对payload去重（相同的data只保存一份，消息中只记录内容哈希）
+    PAYLOAD_DEDUP = os.environ.get('PAYLOAD_DEDUP', 'False').lower() in ['true', '1', 'yes']
+    
+    # 参与去重的最小payload字节数（更小的payload直接内联保存）
+    PAYLOAD_DEDUP_MIN_SIZE = int(os.environ.get('PAYLOAD_DEDUP_MIN_SIZE', 256))
+    
+    # 超过多少字节的payload转存到blob文件（消息中只保留引用和预览，0表示不转存）
+    PAYLOAD_SPILL_SIZE = int(os.environ.get('PAYLOAD_SPILL_SIZE', 1024 * 1024))
+    
+    # 消息日志达到多少条后重写活跃消息快照（messages.json）
+    SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', 200))
+    
+    # 活跃消息内存预算（字节，超过后自动归档最旧的消息，0表示只按条数限制）
+    ACTIVE_MEMORY_BUDGET = int(os.environ.get('ACTIVE_MEMORY_BUDGET', 0))
+    
     # 每页显示消息数
     PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 20))
     
+    # 归档超过多少天后转换为压缩冷归档（0表示不转换）
+    COLD_ARCHIVE_AFTER_DAYS = int(os.environ.get('COLD_ARCHIVE_AFTER_DAYS', 7))
+    
+    # 冷归档压缩算法 (zlib/gzip/lzma)
+    COLD_ARCHIVE_CODEC = os.environ.get('COLD_ARCHIVE_CODEC', 'zlib')
+    
+    # 冷归档每个压缩块的消息数
+    COLD_ARCHIVE_BLOCK_RECORDS = int(os.environ.get('COLD_ARCHIVE_BLOCK_RECORDS', 128))
+    
+    # Webhook请求体大小上限（字节，0表示不限制）
+    MAX_WEBHOOK_BODY_SIZE = int(os.environ.get('MAX_WEBHOOK_BODY_SIZE', 10 * 1024 * 1024))
+    
+    # 请求体超过该大小时暂存到临时文件（字节）
+    WEBHOOK_SPILL_SIZE = int(os.environ.get('WEBHOOK_SPILL_SIZE', 1024 * 1024))
+    
+    # 消息摘要预览长度（字符数）
+    SUMMARY_PREVIEW_LENGTH = int(os.environ.get('SUMMARY_PREVIEW_LENGTH', 200))
+    
+    # 归档扫描进程数（0表示CPU核数，1表示不使用进程池）
+    SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 0))
+    
+    # 查询结果缓存大小（字节，0表示不缓存）
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    
+    # 预编码片段缓存条数（消息JSON、摘要JSON、Dashboard消息行，0表示不缓存）
+    FRAGMENT_CACHE_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_ENTRIES', 5000))
+    
     # ==================== Webhook默认设置 ====================
     # 默认Webhook签名密钥
     DEFAULT_WEBHOOK_SECRET = os.environ.get('DEFAULT_WEBHOOK_SECRET', '0xca74f404e0c7bfa35b13b511097df966d5a65597')
@@ -70,13 +117,22 @@ class Config:
     # 默认事件过滤器
     DEFAULT_EVENT_FILTER = os.environ.get('DEFAULT_EVENT_FILTER', '')
     
+    # 默认索引字段（逗号分隔的JSON路径，如 data.action,data.repository.full_name）
+    DEFAULT_INDEXED_FIELDS = os.environ.get('DEFAULT_INDEXED_FIELDS', '')
+    
+    # 默认归档保留天数（超过后删除归档文件，0表示永久保留）
+    DEFAULT_RETENTION_DAYS = int(os.environ.get('DEFAULT_RETENTION_DAYS', 0))
+    
     # 默认设置字典
     @property
     def DEFAULT_SETTINGS(self):
         return {
             'secret': self.DEFAULT_WEBHOOK_SECRET,
             'enabled': self.DEFAULT_WEBHOOK_ENABLED,
-            'event_filter': self.DEFAULT_EVENT_FILTER
+            'event_filter': self.DEFAULT_EVENT_FILTER,
+            'indexed_fields': [path.strip() for path in self.DEFAULT_INDEXED_FIELDS.split(',') if path.strip()],
+            'retention_days': self.DEFAULT_RETENTION_DAYS,
+            'sources': {}
         }
     
     # ==================== 实时推送配置 ====================
@@ -89,16 +145,44 @@ class Config:
     # 自动刷新间隔（秒）
     AUTO_REFRESH_INTERVAL = int(os.environ.get('AUTO_REFRESH_INTERVAL', 5))
     
+    # SSE事件合并窗口（毫秒）：第一个事件到达后最多等待这么久，合并为一个批量帧发出，0表示不合并
+    SSE_COALESCE_WINDOW_MS = int(os.environ.get('SSE_COALESCE_WINDOW_MS', 100))
+    
+    # 单个SSE批量帧最多包含的事件数
+    SSE_MAX_BATCH = int(os.environ.get('SSE_MAX_BATCH', 100))
+    
+    # SSE事件缓冲区大小（条），连接落后超过此数量时只收到gap标记，由页面重新获取消息列表
+    SSE_BUFFER_EVENTS = int(os.environ.get('SSE_BUFFER_EVENTS', 1000))
+    
+    # 统计增量事件的最小间隔（毫秒）：间隔内的统计变化累加后一起推送，0表示每次变化都推送
+    SSE_STATS_INTERVAL_MS = int(os.environ.get('SSE_STATS_INTERVAL_MS', 1000))
+    
+    # ==================== 响应压缩配置 ====================
+    # 是否按 Accept-Encoding 压缩响应（gzip/deflate）
+    RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', 'True').lower() in ['true', '1', 'yes']
+    
+    # 压缩的最小响应大小（字节），更小的响应直接返回
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    
+    # 压缩级别（1-9，越大压缩率越高、CPU消耗越多）
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))
+    
     # ==================== 安全配置 ====================
     # 是否启用签名验证
     ENABLE_SIGNATURE_VERIFICATION = os.environ.get('ENABLE_SIGNATURE_VERIFICATION', 'True').lower() in ['true', '1', 'yes']
     
-    # 支持的签名头部
-    SIGNATURE_HEADERS = [
-        'X-Hub-Signature-256',
-        'X-Signature',
-        'X-GitHub-Signature-256'
-    ]
+    # 支持的签名头部及签名值没有算法前缀（如 sha256=）时使用的算法
+    # 格式: 头部:算法，逗号分隔；算法支持 sha1/sha256/sha512
+    SIGNATURE_HEADERS = {
+        header.strip(): (algorithm.strip() or 'sha256').lower()
+        for header, _, algorithm in (
+            item.partition(':') for item in os.environ.get(
+                'SIGNATURE_HEADERS',
+                'X-Hub-Signature-256:sha256,X-Hub-Signature:sha1,X-Signature:sha256,X-GitHub-Signature-256:sha256'
+            ).split(',')
+        )
+        if header.strip()
+    }
     
     # ==================== 日志配置 ====================
     # 日志级别
@@ -116,6 +200,7 @@ class Config:
         """确保必要的目录存在"""
         self.DATA_DIR.mkdir(exist_ok=True)
         self.ARCHIVE_DIR.mkdir(exist_ok=True)
+        self.SOURCES_DIR.mkdir(exist_ok=True)
     
     def to_dict(self):
         """将配置转换为字典格式"""
@@ -128,14 +213,38 @@ class Config:
             'DATA_DIR': str(self.DATA_DIR),
             'MAX_MESSAGES_PER_FILE': self.MAX_MESSAGES_PER_FILE,
             'MAX_ACTIVE_MESSAGES': self.MAX_ACTIVE_MESSAGES,
+            'ACTIVE_MEMORY_BUDGET': self.ACTIVE_MEMORY_BUDGET,
+            'SNAPSHOT_INTERVAL': self.SNAPSHOT_INTERVAL,
+            'PAYLOAD_DEDUP': self.PAYLOAD_DEDUP,
+            'PAYLOAD_DEDUP_MIN_SIZE': self.PAYLOAD_DEDUP_MIN_SIZE,
+            'PAYLOAD_SPILL_SIZE': self.PAYLOAD_SPILL_SIZE,
             'PAGE_SIZE': self.PAGE_SIZE,
+            'COLD_ARCHIVE_AFTER_DAYS': self.COLD_ARCHIVE_AFTER_DAYS,
+            'COLD_ARCHIVE_CODEC': self.COLD_ARCHIVE_CODEC,
+            'COLD_ARCHIVE_BLOCK_RECORDS': self.COLD_ARCHIVE_BLOCK_RECORDS,
+            'MAX_WEBHOOK_BODY_SIZE': self.MAX_WEBHOOK_BODY_SIZE,
+            'WEBHOOK_SPILL_SIZE': self.WEBHOOK_SPILL_SIZE,
+            'SUMMARY_PREVIEW_LENGTH': self.SUMMARY_PREVIEW_LENGTH,
+            'SCAN_WORKERS': self.SCAN_WORKERS,
+            'RESULT_CACHE_MAX_BYTES': self.RESULT_CACHE_MAX_BYTES,
+            'FRAGMENT_CACHE_ENTRIES': self.FRAGMENT_CACHE_ENTRIES,
             'DEFAULT_WEBHOOK_SECRET': self.DEFAULT_WEBHOOK_SECRET,
             'DEFAULT_WEBHOOK_ENABLED': self.DEFAULT_WEBHOOK_ENABLED,
             'DEFAULT_EVENT_FILTER': self.DEFAULT_EVENT_FILTER,
+            'DEFAULT_INDEXED_FIELDS': self.DEFAULT_INDEXED_FIELDS,
+            'DEFAULT_RETENTION_DAYS': self.DEFAULT_RETENTION_DAYS,
             'SSE_HEARTBEAT_INTERVAL': self.SSE_HEARTBEAT_INTERVAL,
             'REALTIME_RECONNECT_INTERVAL': self.REALTIME_RECONNECT_INTERVAL,
             'AUTO_REFRESH_INTERVAL': self.AUTO_REFRESH_INTERVAL,
+            'SSE_COALESCE_WINDOW_MS': self.SSE_COALESCE_WINDOW_MS,
+            'SSE_MAX_BATCH': self.SSE_MAX_BATCH,
+            'SSE_BUFFER_EVENTS': self.SSE_BUFFER_EVENTS,
+            'SSE_STATS_INTERVAL_MS': self.SSE_STATS_INTERVAL_MS,
+            'RESPONSE_COMPRESSION': self.RESPONSE_COMPRESSION,
+            'COMPRESSION_MIN_SIZE': self.COMPRESSION_MIN_SIZE,
+            'COMPRESSION_LEVEL': self.COMPRESSION_LEVEL,
             'ENABLE_SIGNATURE_VERIFICATION': self.ENABLE_SIGNATURE_VERIFICATION,
+            'SIGNATURE_HEADERS': ','.join(f'{header}:{algorithm}' for header, algorithm in self.SIGNATURE_HEADERS.items()),
             'LOG_LEVEL': self.LOG_LEVEL,
             'ENABLE_ACCESS_LOG': self.ENABLE_ACCESS_LOG
         }
@@ -0,0 +1,200 @@
+"""
+实时推送事件广播
+所有新消息事件按序号写入一个环形缓冲区，每个SSE连接维护自己的读取位置（不再共用一个队列）。
+连接读取时合并短时间内到达的事件：第一个事件到达后最多等待一个合并窗口，
+或累计到单帧上限后，作为一个批量帧发出（带事件数）；只有一个事件时仍发送单条事件帧。
+读取位置已落后到缓冲区之外的连接只收到一个 gap 标记，由客户端重新获取消息列表
+（按来源订阅的连接只在本来源的事件被覆盖时收到）。
+存储分区的统计变化以增量事件（stats）推送，每个来源按最小间隔合并后发出，客户端不需要轮询统计接口。
+"""
+import json
+import threading
+import time
+from collections import deque
+
+
+class EventBroadcaster:
+    """新消息事件的环形缓冲区和等待通知"""
+
+    def __init__(self, buffer_size=1000, window=0.1, max_batch=100):
+        self.buffer_size = max(1, buffer_size)
+        self.window = window  # 合并窗口（秒），0表示不合并
+        self.max_batch = max(1, max_batch)
+        self.events = deque(maxlen=self.buffer_size)  # (序号, 来源名, 事件JSON)
+        self.evicted = {}  # 来源名 -> 该来源已被覆盖的最后一个事件序号
+        self.last_seq = 0
+        self.condition = threading.Condition()
+        self.published = 0
+        self.frames = 0
+        self.batches = 0
+        self.gaps = 0
+
+    def publish(self, source, event):
+        """发布一个事件（事件为已编码的JSON字符串）"""
+        with self.condition:
+            self.last_seq += 1
+            if len(self.events) == self.buffer_size:
+                oldest_seq, oldest_source, _ = self.events[0]
+                self.evicted[oldest_source] = oldest_seq
+            self.events.append((self.last_seq, source, event))
+            self.published += 1
+            self.condition.notify_all()
+
+    def subscribe(self, source=None):
+        """创建一个连接的订阅（从当前位置开始，source不为None时只接收该来源的事件）"""
+        with self.condition:
+            return Subscription(self, self.last_seq, source)
+
+    def stats(self):
+        with self.condition:
+            return {'published': self.published, 'frames': self.frames, 'batches': self.batches,
+                    'gaps': self.gaps, 'buffered': len(self.events), 'buffer_size': self.buffer_size,
+                    'window_ms': round(self.window * 1000), 'max_batch': self.max_batch}
+
+
+class Subscription:
+    """一个SSE连接的读取位置"""
+
+    def __init__(self, broadcaster, cursor, source):
+        self.broadcaster = broadcaster
+        self.cursor = cursor
+        self.source = source
+
+    def _pending(self):
+        """读取位置之后的事件（需要持有广播器的锁）；读取位置已被覆盖时返回None"""
+        events = self.broadcaster.events
+        if not events or events[-1][0] <= self.cursor:
+            return []
+        first_seq = events[0][0]
+        if self.cursor + 1 < first_seq:
+            if self.source is None or self.broadcaster.evicted.get(self.source, 0) > self.cursor:
+                return None
+            # 被覆盖的都是其他来源的事件：没有丢失本来源的事件，从缓冲区开头继续读取
+            self.cursor = first_seq - 1
+        start = self.cursor + 1 - first_seq
+        return [event for event in (events[i] for i in range(start, len(events)))
+                if self.source is None or event[1] == self.source]
+
+    def next_frame(self, timeout):
+        """
+        等待下一帧，返回SSE data字段的内容；超时没有事件时返回None（由调用方发送心跳）
+        """
+        broadcaster = self.broadcaster
+        deadline = time.monotonic() + timeout
+        with broadcaster.condition:
+            while True:
+                pending = self._pending()
+                if pending is None or pending:
+                    break
+                # 只有其他来源的事件：跳过它们继续等待
+                self.cursor = broadcaster.last_seq
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                broadcaster.condition.wait(remaining)
+
+            # 第一个事件已到达：在合并窗口内继续收集，直到达到单帧上限
+            window_end = time.monotonic() + broadcaster.window
+            while pending is not None and len(pending) < broadcaster.max_batch:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                broadcaster.condition.wait(remaining)
+                pending = self._pending()
+
+            broadcaster.frames += 1
+            if pending is None:
+                # 落后太多：跳到最新位置，客户端重新获取
+                missed = broadcaster.last_seq - self.cursor
+                self.cursor = broadcaster.last_seq
+                broadcaster.gaps += 1
+                return '{"type": "gap", "missed": ' + str(missed) + '}'
+
+            batch = pending[:broadcaster.max_batch]
+            # 全部待发事件都在本帧中时，读取位置直接跳到最新（越过其他来源的事件，避免它们把本连接挤出缓冲区）
+            self.cursor = broadcaster.last_seq if len(batch) == len(pending) else batch[-1][0]
+            if len(batch) == 1:
+                return batch[0][2]
+            broadcaster.batches += 1
+            return ('{"type": "batch", "count": ' + str(len(batch)) + ', "events": [' +
+                    ', '.join(event for _, _, event in batch) + ']}')
+
+
+def merge_delta(target, delta):
+    """将统计增量累加到target（嵌套字典逐项累加，如按事件类型的计数）"""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            merge_delta(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+def nonzero_delta(delta):
+    """去掉累加后为0的项"""
+    result = {}
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            value = nonzero_delta(value)
+        if value:
+            result[key] = value
+    return result
+
+
+class StatsDeltaPublisher:
+    """
+    按来源合并统计增量，每个来源最多每interval秒发出一个 stats 事件（interval为0时每次变化都发出）。
+    间隔内到达的增量累加起来，由定时器在间隔结束时发出。
+    """
+
+    def __init__(self, broadcaster, interval=1.0):
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self.pending = {}    # 来源名 -> 累加中的增量
+        self.last_sent = {}  # 来源名 -> 上次发出的时间
+        self.timers = {}     # 来源名 -> 等待发出的定时器
+        self.lock = threading.Lock()
+        self.reported = 0
+        self.emitted = 0
+
+    def add(self, source, delta):
+        """报告一个来源的统计增量"""
+        with self.lock:
+            self.reported += 1
+            merge_delta(self.pending.setdefault(source, {}), delta)
+            if source in self.timers:
+                return
+            wait = self.last_sent.get(source, float('-inf')) + self.interval - time.monotonic()
+            if wait > 0:
+                timer = threading.Timer(wait, self.flush, args=(source,))
+                timer.daemon = True
+                self.timers[source] = timer
+                timer.start()
+                return
+            delta = self._take(source)
+        self._publish(source, delta)
+
+    def flush(self, source):
+        """发出来源累加的增量（定时器回调）"""
+        with self.lock:
+            self.timers.pop(source, None)
+            delta = self._take(source)
+        self._publish(source, delta)
+
+    def _take(self, source):
+        """取出累加的增量（需要持有锁）"""
+        delta = nonzero_delta(self.pending.pop(source, {}))
+        if delta:
+            self.last_sent[source] = time.monotonic()
+            self.emitted += 1
+        return delta
+
+    def _publish(self, source, delta):
+        if delta:
+            self.broadcaster.publish(source, json.dumps({'type': 'stats', 'source': source or None, 'delta': delta},
+                                                        ensure_ascii=False))
+
+    def stats(self):
+        with self.lock:
+            return {'reported': self.reported, 'emitted': self.emitted,
+                    'interval_ms': round(self.interval * 1000), 'pending_sources': len(self.pending)}
@@ -0,0 +1,207 @@
+"""
+字段二级索引
+在设置中声明需要索引的JSON路径（如 data.repository.full_name、data.action），
+接收消息时提取一次字段值，建立 路径 -> 值 -> 消息ID集合 的索引。
+活跃消息的索引保存在内存中，归档消息的索引按归档段保存为 messages_YYYY-MM-DD.fidx。
+"""
+import json
+import threading
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+
+INDEX_SUFFIX = '.fidx'
+
+
+def extract_path(message, path):
+    """按点分路径提取字段值（列表可用数字下标），路径不存在时返回None"""
+    value = message
+    for part in path.split('.'):
+        if isinstance(value, Mapping):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def normalize_value(value):
+    """将标量字段值转换为索引使用的字符串，对象和数组不建立索引"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return None
+
+
+def match_filters(message, filters):
+    """检查消息是否满足所有 路径=值 条件"""
+    return all(normalize_value(extract_path(message, path)) == value for path, value in filters.items())
+
+
+class FieldPostings:
+    """一组消息的字段索引"""
+
+    def __init__(self, paths, postings=None):
+        self.paths = list(paths)
+        self.postings = postings or {path: {} for path in self.paths}
+
+    def add(self, message):
+        for path in self.paths:
+            value = normalize_value(extract_path(message, path))
+            if value is not None:
+                self.postings.setdefault(path, {}).setdefault(value, set()).add(message['id'])
+
+    def remove(self, message):
+        for path in self.paths:
+            value = normalize_value(extract_path(message, path))
+            ids = self.postings.get(path, {}).get(value)
+            if ids is not None:
+                ids.discard(message['id'])
+                if not ids:
+                    del self.postings[path][value]
+
+    def covers(self, paths):
+        return all(path in self.paths for path in paths)
+
+    def lookup(self, path, value):
+        return self.postings.get(path, {}).get(value, set())
+
+    def to_bytes(self):
+        data = {
+            'paths': self.paths,
+            'postings': {path: {value: sorted(ids) for value, ids in values.items()}
+                         for path, values in self.postings.items()}
+        }
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, raw):
+        data = json.loads(zlib.decompress(raw))
+        postings = {path: {value: set(ids) for value, ids in values.items()}
+                    for path, values in data['postings'].items()}
+        return cls(data['paths'], postings)
+
+
+class FieldIndex:
+    """活跃消息内存字段索引 + 归档段字段索引文件"""
+
+    def __init__(self, archive_dir, paths):
+        self.archive_dir = Path(archive_dir)
+        self.paths = list(paths)
+        self.active = FieldPostings(self.paths)
+        self.lock = threading.Lock()
+        self._segment_cache = {}  # 索引文件路径 -> (修改时间, FieldPostings)
+
+    def index_path(self, segment_name):
+        return self.archive_dir / (Path(segment_name).stem + INDEX_SUFFIX)
+
+    def set_paths(self, paths, active_messages):
+        """更新索引路径并重建活跃消息索引（归档段索引在查询时按需重建）"""
+        with self.lock:
+            self.paths = list(paths)
+            self.active = FieldPostings(self.paths)
+            for msg in active_messages:
+                self.active.add(msg)
+
+    # ---------- 活跃消息 ----------
+
+    def add_active(self, message):
+        with self.lock:
+            self.active.add(message)
+
+    def remove_active(self, message):
+        with self.lock:
+            self.active.remove(message)
+
+    def clear_active(self):
+        with self.lock:
+            self.active = FieldPostings(self.paths)
+
+    # ---------- 归档段 ----------
+
+    def _load_segment(self, path):
+        mtime = path.stat().st_mtime_ns
+        cached = self._segment_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        postings = FieldPostings.from_bytes(path.read_bytes())
+        self._segment_cache[path] = (mtime, postings)
+        return postings
+
+    def _save_segment(self, path, postings):
+        tmp_path = path.with_suffix(INDEX_SUFFIX + '.tmp')
+        tmp_path.write_bytes(postings.to_bytes())
+        tmp_path.replace(path)
+
+    def add_to_segment(self, segment_name, messages, load_messages):
+        """
+        将归档的消息合并到对应归档段的字段索引，并从活跃索引中移除；
+        索引文件缺失或索引路径有变化时通过load_messages读取整段重建
+        """
+        path = self.index_path(segment_name)
+        with self.lock:
+            postings = self._load_segment(path) if path.exists() else None
+            if postings is not None and postings.covers(self.paths):
+                for msg in messages:
+                    postings.add(msg)
+            else:
+                postings = FieldPostings(self.paths)
+                for msg in load_messages():
+                    postings.add(msg)
+            for msg in messages:
+                self.active.remove(msg)
+            self._save_segment(path, postings)
+
+    def drop_segment(self, segment_name):
+        """删除归档段字段索引（随归档段一起清理）"""
+        path = self.index_path(segment_name)
+        with self.lock:
+            self._segment_cache.pop(path, None)
+            if path.exists():
+                path.unlink()
+
+    def segment_postings(self, segment_name, load_messages, paths):
+        """获取归档段字段索引，缺失或未覆盖所需路径时读取整段重建"""
+        path = self.index_path(segment_name)
+        with self.lock:
+            if path.exists():
+                postings = self._load_segment(path)
+                if postings.covers(paths):
+                    return postings
+
+            postings = FieldPostings(self.paths)
+            for msg in load_messages():
+                postings.add(msg)
+            self._save_segment(path, postings)
+            self._segment_cache.pop(path, None)
+            return postings
+
+    # ---------- 查询 ----------
+
+    def lookup(self, filters, segments=()):
+        """
+        查找满足所有 路径=值 条件的消息ID（路径必须已建立索引）
+        segments: [(归档文件名, 读取全部消息的函数), ...]
+        """
+        with self.lock:
+            ids = self._intersect(self.active, filters)
+        for segment_name, load_messages in segments:
+            try:
+                ids |= self._intersect(self.segment_postings(segment_name, load_messages, filters), filters)
+            except Exception as e:
+                print(f"读取字段索引失败 {segment_name}: {e}")
+        return ids
+
+    @staticmethod
+    def _intersect(postings, filters):
+        result = None
+        for path, value in filters.items():
+            ids = postings.lookup(path, value)
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
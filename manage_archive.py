@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+归档管理工具
+用于查看归档文件、将旧版JSON归档迁移为NDJSON归档段、转换压缩冷归档，以及重建消息ID索引
+（迁移和重建索引前请先停止Webhook服务）
+默认处理所有存储分区（默认分区和 sources/ 下的命名来源分区），--source <来源名> 只处理一个分区（空字符串为默认分区）
+"""
+
+import re
+import sys
+
+from config import config
+from archive_segments import (open_segment, SEGMENT_SUFFIX, LEGACY_SUFFIX, COLD_SUFFIX, load_legacy_archive,
+                              migrate_legacy_archive, convert_to_cold, find_cold_candidates)
+from message_index import MessageIndex, INDEX_FILE_NAME, SEGMENTS_FILE_NAME
+
+# 命名来源名称（与 /webhook/<source> 相同的规则）
+SOURCE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def partition_archive_dir(source):
+    """来源对应的归档目录（与存储分区的目录结构一致：默认分区为 ARCHIVE_DIR，命名来源为 sources/<来源名>/archive）"""
+    if not source:
+        return config.ARCHIVE_DIR
+    return config.SOURCES_DIR / source / 'archive'
+
+def list_partitions(source=None):
+    """要处理的分区 [(名称, 归档目录)]；source为None时返回所有已有归档目录的分区"""
+    if source is not None:
+        return [(source or 'default', partition_archive_dir(source))]
+    partitions = [('default', config.ARCHIVE_DIR)]
+    if config.SOURCES_DIR.exists():
+        for source_dir in sorted(config.SOURCES_DIR.iterdir()):
+            archive_dir = partition_archive_dir(source_dir.name)
+            if SOURCE_NAME_PATTERN.match(source_dir.name) and archive_dir.is_dir():
+                partitions.append((source_dir.name, archive_dir))
+    return partitions
+
+def list_archive_files(archive_dir):
+    """按日期列出分区的所有归档文件"""
+    files = [path for path in archive_dir.glob('messages_*')
+             if path.suffix in (SEGMENT_SUFFIX, COLD_SUFFIX, LEGACY_SUFFIX)]
+    return sorted(files, key=lambda path: path.stem)
+
+def show_archives(archive_dir):
+    """显示归档文件信息"""
+    files = list_archive_files(archive_dir)
+    if not files:
+        print("📭 没有归档文件")
+        return
+
+    total_messages = 0
+    for path in files:
+        try:
+            if path.suffix in (SEGMENT_SUFFIX, COLD_SUFFIX):
+                with open_segment(path) as segment:
+                    count = len(segment)
+                file_format = 'NDJSON' if path.suffix == SEGMENT_SUFFIX else '冷归档(压缩)'
+            else:
+                count = len(load_legacy_archive(path))
+                file_format = 'JSON(旧版)'
+            total_messages += count
+            print(f"   📄 {path.name}: {count} 条, {path.stat().st_size} 字节, {file_format}")
+        except Exception as e:
+            print(f"   ❌ {path.name}: 读取失败 {e}")
+
+    print()
+    print(f"📊 共 {len(files)} 个归档文件, {total_messages} 条消息")
+
+def migrate_archives(archive_dir):
+    """将旧版JSON数组归档转换为NDJSON归档段"""
+    legacy_files = [path for path in list_archive_files(archive_dir) if path.suffix == LEGACY_SUFFIX]
+    if not legacy_files:
+        print("✅ 没有需要迁移的旧版归档文件")
+        return
+
+    message_index = MessageIndex(archive_dir)
+    for path in legacy_files:
+        try:
+            old_size = path.stat().st_size
+            segment_name, locations = migrate_legacy_archive(path)
+            message_index.update(segment_name, locations)
+            new_size = (archive_dir / segment_name).stat().st_size
+            print(f"   ✅ {path.name} → {segment_name}: {len(locations)} 条, {old_size} → {new_size} 字节")
+        except Exception as e:
+            print(f"   ❌ {path.name} 迁移失败: {e}")
+
+    print("✅ 迁移完成")
+
+def compress_archives(archive_dir, days):
+    """将较旧的归档转换为压缩冷归档"""
+    candidates = find_cold_candidates(archive_dir, days)
+    if not candidates:
+        print("✅ 没有需要转换的归档文件")
+        return
+
+    message_index = MessageIndex(archive_dir)
+    for path in candidates:
+        try:
+            old_size = path.stat().st_size
+            cold_name, locations = convert_to_cold(path, codec=config.COLD_ARCHIVE_CODEC,
+                                                   block_records=config.COLD_ARCHIVE_BLOCK_RECORDS)
+            message_index.update(cold_name, locations)
+            new_size = (archive_dir / cold_name).stat().st_size
+            print(f"   ✅ {path.name} → {cold_name}: {len(locations)} 条, {old_size} → {new_size} 字节")
+        except Exception as e:
+            print(f"   ❌ {path.name} 转换失败: {e}")
+
+    print("✅ 转换完成")
+
+def rebuild_index(archive_dir):
+    """删除并重建消息ID索引"""
+    for name in (INDEX_FILE_NAME, SEGMENTS_FILE_NAME):
+        path = archive_dir / name
+        if path.exists():
+            path.unlink()
+
+    message_index = MessageIndex(archive_dir)
+    message_index.ensure_indexed(list_archive_files(archive_dir))
+    print(f"✅ 已索引 {len(message_index.entries)} 条归档消息")
+
+def show_help():
+    """显示帮助信息"""
+    print("📦 Webhook归档管理工具")
+    print("=" * 50)
+    print("可用命令:")
+    print("  show      - 显示归档文件信息")
+    print("  migrate   - 将旧版JSON归档迁移为NDJSON格式")
+    print("  compress  - 将较旧的归档转换为压缩冷归档（可指定天数）")
+    print("  reindex   - 重建消息ID索引")
+    print("  help      - 显示此帮助信息")
+    print()
+    print("选项:")
+    print("  --source <来源名>  只处理该命名来源的分区（--source '' 为默认分区），默认处理所有分区")
+    print()
+    print("示例:")
+    print("  python manage_archive.py show")
+    print("  python manage_archive.py migrate")
+    print("  python manage_archive.py compress 30")
+    print("  python manage_archive.py reindex --source github")
+
+def parse_args(argv):
+    """解析命令行参数，返回 (命令参数列表, 来源名或None)"""
+    args = list(argv)
+    source = None
+    if '--source' in args:
+        position = args.index('--source')
+        if position + 1 >= len(args):
+            raise ValueError("--source 需要指定来源名")
+        source = args[position + 1].strip()
+        del args[position:position + 2]
+        if source and not SOURCE_NAME_PATTERN.match(source):
+            raise ValueError(f"无效的来源名: {source}")
+    return args, source
+
+def main():
+    """主函数"""
+    try:
+        args, source = parse_args(sys.argv[1:])
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    if not args:
+        show_help()
+        return
+
+    command = args[0].lower()
+
+    commands = {
+        'show': ("📦 归档文件信息", show_archives),
+        'migrate': ("🔄 迁移旧版归档文件", migrate_archives),
+        'compress': ("🗜️  转换压缩冷归档", compress_archives),
+        'reindex': ("🔧 重建消息ID索引", rebuild_index)
+    }
+
+    if command == 'help':
+        show_help()
+        return
+    if command not in commands:
+        print(f"❌ 未知命令: {command}")
+        print()
+        show_help()
+        return
+
+    extra = []
+    if command == 'compress':
+        days = int(args[1]) if len(args) > 1 else config.COLD_ARCHIVE_AFTER_DAYS
+        extra.append(days)
+
+    title, handler = commands[command]
+    partitions = list_partitions(source)
+    for name, archive_dir in partitions:
+        print(f"{title} [{name}]" + (f"（{extra[0]} 天前）" if command == 'compress' else ''))
+        print("=" * 50)
+        if not archive_dir.is_dir():
+            print(f"📭 分区没有归档目录: {archive_dir}")
+        else:
+            handler(archive_dir, *extra)
+        print()
+
+if __name__ == "__main__":
+    main()
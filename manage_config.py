@@ -8,6 +8,7 @@ import json
 import os
 from pathlib import Path
 from config import config, get_config, config_map
+from request_body import SIGNATURE_ALGORITHMS
 
 def show_current_config():
     """显示当前配置"""
@@ -24,10 +25,16 @@ def show_current_config():
     categories = {
         '应用配置': ['SECRET_KEY', 'DEBUG', 'HOST', 'PORT'],
         '管理员配置': ['ADMIN_USERNAME'],
-        '存储配置': ['DATA_DIR', 'MAX_MESSAGES_PER_FILE', 'MAX_ACTIVE_MESSAGES', 'PAGE_SIZE'],
-        'Webhook配置': ['DEFAULT_WEBHOOK_SECRET', 'DEFAULT_WEBHOOK_ENABLED', 'DEFAULT_EVENT_FILTER'],
-        '实时推送配置': ['SSE_HEARTBEAT_INTERVAL', 'REALTIME_RECONNECT_INTERVAL', 'AUTO_REFRESH_INTERVAL'],
-        '安全配置': ['ENABLE_SIGNATURE_VERIFICATION'],
+        '存储配置': ['DATA_DIR', 'MAX_MESSAGES_PER_FILE', 'MAX_ACTIVE_MESSAGES', 'ACTIVE_MEMORY_BUDGET', 'SNAPSHOT_INTERVAL',
+                    'PAYLOAD_DEDUP', 'PAYLOAD_DEDUP_MIN_SIZE', 'PAYLOAD_SPILL_SIZE', 'PAGE_SIZE', 'SUMMARY_PREVIEW_LENGTH'],
+        '归档配置': ['COLD_ARCHIVE_AFTER_DAYS', 'COLD_ARCHIVE_CODEC', 'COLD_ARCHIVE_BLOCK_RECORDS', 'SCAN_WORKERS', 'RESULT_CACHE_MAX_BYTES', 'FRAGMENT_CACHE_ENTRIES'],
+        'Webhook配置': ['DEFAULT_WEBHOOK_SECRET', 'DEFAULT_WEBHOOK_ENABLED', 'DEFAULT_EVENT_FILTER', 'DEFAULT_INDEXED_FIELDS',
+                       'DEFAULT_RETENTION_DAYS', 'MAX_WEBHOOK_BODY_SIZE', 'WEBHOOK_SPILL_SIZE'],
+        '实时推送配置': ['SSE_HEARTBEAT_INTERVAL', 'REALTIME_RECONNECT_INTERVAL', 'AUTO_REFRESH_INTERVAL',
+                         'SSE_COALESCE_WINDOW_MS', 'SSE_MAX_BATCH', 'SSE_BUFFER_EVENTS',
+                         'SSE_STATS_INTERVAL_MS'],
+        '响应压缩配置': ['RESPONSE_COMPRESSION', 'COMPRESSION_MIN_SIZE', 'COMPRESSION_LEVEL'],
+        '安全配置': ['ENABLE_SIGNATURE_VERIFICATION', 'SIGNATURE_HEADERS'],
         '日志配置': ['LOG_LEVEL', 'ENABLE_ACCESS_LOG']
     }
     
@@ -69,9 +76,71 @@ def validate_config():
     if config.MAX_ACTIVE_MESSAGES <= 0:
         issues.append(f"活跃消息数必须大于0: {config.MAX_ACTIVE_MESSAGES}")
     
+    if config.ACTIVE_MEMORY_BUDGET < 0:
+        issues.append(f"活跃消息内存预算不能为负数: {config.ACTIVE_MEMORY_BUDGET}")
+    
     if config.MAX_MESSAGES_PER_FILE <= 0:
         issues.append(f"每文件消息数必须大于0: {config.MAX_MESSAGES_PER_FILE}")
     
+    if config.COLD_ARCHIVE_CODEC not in ('zlib', 'gzip', 'lzma'):
+        issues.append(f"冷归档压缩算法无效: {config.COLD_ARCHIVE_CODEC}")
+    
+    if config.COLD_ARCHIVE_BLOCK_RECORDS <= 0:
+        issues.append(f"冷归档每块消息数必须大于0: {config.COLD_ARCHIVE_BLOCK_RECORDS}")
+    
+    if config.SCAN_WORKERS < 0:
+        issues.append(f"归档扫描进程数不能为负数: {config.SCAN_WORKERS}")
+    
+    if config.RESULT_CACHE_MAX_BYTES < 0:
+        issues.append(f"查询结果缓存大小不能为负数: {config.RESULT_CACHE_MAX_BYTES}")
+    
+    if config.FRAGMENT_CACHE_ENTRIES < 0:
+        issues.append(f"预编码片段缓存条数不能为负数: {config.FRAGMENT_CACHE_ENTRIES}")
+    
+    if config.MAX_WEBHOOK_BODY_SIZE < 0:
+        issues.append(f"请求体大小上限不能为负数: {config.MAX_WEBHOOK_BODY_SIZE}")
+    
+    if config.WEBHOOK_SPILL_SIZE <= 0:
+        issues.append(f"请求体暂存阈值必须大于0: {config.WEBHOOK_SPILL_SIZE}")
+    
+    if config.SNAPSHOT_INTERVAL < 0:
+        issues.append(f"快照间隔不能为负数: {config.SNAPSHOT_INTERVAL}")
+    
+    if config.PAYLOAD_DEDUP_MIN_SIZE < 0:
+        issues.append(f"去重最小payload大小不能为负数: {config.PAYLOAD_DEDUP_MIN_SIZE}")
+    
+    if config.PAYLOAD_SPILL_SIZE < 0:
+        issues.append(f"payload转存阈值不能为负数: {config.PAYLOAD_SPILL_SIZE}")
+    
+    if config.SSE_COALESCE_WINDOW_MS < 0:
+        issues.append(f"SSE事件合并窗口不能为负数: {config.SSE_COALESCE_WINDOW_MS}")
+    
+    if config.SSE_MAX_BATCH <= 0:
+        issues.append(f"SSE批量帧事件数必须大于0: {config.SSE_MAX_BATCH}")
+    
+    if config.SSE_BUFFER_EVENTS <= 0:
+        issues.append(f"SSE事件缓冲区大小必须大于0: {config.SSE_BUFFER_EVENTS}")
+    
+    if config.SSE_STATS_INTERVAL_MS < 0:
+        issues.append(f"统计增量推送间隔不能为负数: {config.SSE_STATS_INTERVAL_MS}")
+    
+    if config.COMPRESSION_MIN_SIZE < 0:
+        issues.append(f"压缩的最小响应大小不能为负数: {config.COMPRESSION_MIN_SIZE}")
+    
+    if not 1 <= config.COMPRESSION_LEVEL <= 9:
+        issues.append(f"压缩级别必须在1-9之间: {config.COMPRESSION_LEVEL}")
+    
+    if config.DEFAULT_RETENTION_DAYS < 0:
+        issues.append(f"归档保留天数不能为负数: {config.DEFAULT_RETENTION_DAYS}")
+    
+    if config.SUMMARY_PREVIEW_LENGTH <= 0:
+        issues.append(f"摘要预览长度必须大于0: {config.SUMMARY_PREVIEW_LENGTH}")
+    
+    unsupported = [f'{header}:{algorithm}' for header, algorithm in config.SIGNATURE_HEADERS.items()
+                   if algorithm not in SIGNATURE_ALGORITHMS]
+    if unsupported:
+        issues.append(f"不支持的签名算法: {', '.join(unsupported)}")
+    
     if issues:
         print("❌ 发现以下问题:")
         for issue in issues:
@@ -0,0 +1,170 @@
+"""
+消息ID索引
+将归档消息ID映射到归档文件及字节偏移（冷归档为记录序号），任意消息只需一次定位和一次解析即可读取
+"""
+import json
+import struct
+import threading
+from pathlib import Path
+
+from archive_segments import SEGMENT_SUFFIX, COLD_SUFFIX, open_segment, read_record_at
+
+# 索引条目：消息ID、归档文件编号、字节偏移、记录长度（固定24字节）
+INDEX_ENTRY = struct.Struct('<QIQI')
+
+INDEX_FILE_NAME = 'message_index.bin'
+SEGMENTS_FILE_NAME = 'message_index_segments.json'
+
+
+def dump_messages_with_offsets(messages, f):
+    """
+    按 json.dump(messages, indent=2, ensure_ascii=False) 相同的格式写入消息数组，
+    返回每条消息的位置 {id: (offset, length)}
+    """
+    locations = {}
+    if not messages:
+        f.write(b'[]')
+        return locations
+
+    f.write(b'[\n')
+    position = 2
+    last_index = len(messages) - 1
+    for i, msg in enumerate(messages):
+        record = json.dumps(msg, ensure_ascii=False, indent=2).replace('\n', '\n  ').encode('utf-8')
+        chunk = b'  ' + record + (b',\n' if i < last_index else b'\n')
+        locations[msg['id']] = (position + 2, len(record))
+        f.write(chunk)
+        position += len(chunk)
+    f.write(b']')
+    return locations
+
+
+class MessageIndex:
+    """归档消息ID索引（追加写入，同一ID以最后一条条目为准）"""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = Path(archive_dir)
+        self.index_file = self.archive_dir / INDEX_FILE_NAME
+        self.segments_file = self.archive_dir / SEGMENTS_FILE_NAME
+        self.segments = []
+        self.entries = {}
+        self.entry_count = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """从磁盘加载索引"""
+        self.segments = []
+        self.entries = {}
+        self.entry_count = 0
+
+        try:
+            if self.segments_file.exists():
+                with open(self.segments_file, 'r', encoding='utf-8') as f:
+                    self.segments = json.load(f)
+            if self.index_file.exists():
+                data = self.index_file.read_bytes()
+                usable = len(data) - len(data) % INDEX_ENTRY.size
+                for message_id, segment_no, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+                    self.entries[message_id] = (segment_no, offset, length)
+                self.entry_count = usable // INDEX_ENTRY.size
+        except Exception as e:
+            print(f"加载消息索引失败: {e}")
+            self.segments = []
+            self.entries = {}
+            self.entry_count = 0
+
+    def _segment_no(self, segment_name):
+        """获取归档文件编号，新文件追加到文件表"""
+        if segment_name not in self.segments:
+            self.segments.append(segment_name)
+            with open(self.segments_file, 'w', encoding='utf-8') as f:
+                json.dump(self.segments, f, ensure_ascii=False)
+        return self.segments.index(segment_name)
+
+    def update(self, segment_name, locations):
+        """记录一个归档文件中所有消息的位置"""
+        with self.lock:
+            segment_no = self._segment_no(segment_name)
+            buffer = bytearray()
+            for message_id, (offset, length) in locations.items():
+                buffer += INDEX_ENTRY.pack(message_id, segment_no, offset, length)
+                self.entries[message_id] = (segment_no, offset, length)
+            with open(self.index_file, 'ab') as f:
+                f.write(buffer)
+            self.entry_count += len(locations)
+
+            # 过期条目过多时压缩索引文件
+            if self.entry_count > 2 * len(self.entries) + 1024:
+                self._compact()
+
+    def drop_segment(self, segment_name):
+        """删除一个归档文件的全部条目（归档文件超过保留期限被删除时调用）"""
+        with self.lock:
+            if segment_name not in self.segments:
+                return
+            segment_no = self.segments.index(segment_name)
+            self.entries = {message_id: location for message_id, location in self.entries.items()
+                            if location[0] != segment_no}
+            self._compact()
+
+    def _compact(self):
+        """重写索引文件，只保留每个ID的最新条目"""
+        tmp_file = self.index_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            f.write(b''.join(INDEX_ENTRY.pack(message_id, *location)
+                             for message_id, location in self.entries.items()))
+        tmp_file.replace(self.index_file)
+        self.entry_count = len(self.entries)
+
+    def index_segment(self, segment_path):
+        """为已有归档文件建立索引（旧版JSON归档按相同格式重写以获得字节偏移）"""
+        segment_path = Path(segment_path)
+        if segment_path.suffix in (SEGMENT_SUFFIX, COLD_SUFFIX):
+            with open_segment(segment_path) as segment:
+                self.update(segment_path.name, segment.locations())
+            return
+
+        with open(segment_path, 'r', encoding='utf-8') as f:
+            messages = json.load(f)
+
+        tmp_file = segment_path.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            locations = dump_messages_with_offsets(messages, f)
+        tmp_file.replace(segment_path)
+        self.update(segment_path.name, locations)
+
+    def ensure_indexed(self, segment_paths):
+        """为尚未建立索引的归档文件补建索引"""
+        for segment_path in segment_paths:
+            if Path(segment_path).name not in self.segments:
+                try:
+                    self.index_segment(segment_path)
+                except Exception as e:
+                    print(f"建立归档索引失败 {segment_path}: {e}")
+
+    def lookup(self, message_id):
+        """查找消息位置，返回 (文件路径, 偏移, 长度) 或 None"""
+        location = self.entries.get(message_id)
+        if location is None:
+            return None
+        segment_no, offset, length = location
+        return self.archive_dir / self.segments[segment_no], offset, length
+
+    def read_message(self, message_id):
+        """按ID读取归档消息（一次定位、一次解析）"""
+        location = self.lookup(message_id)
+        if location is None:
+            return None
+
+        segment_path, offset, length = location
+        try:
+            message = read_record_at(segment_path, offset, length)
+        except Exception as e:
+            print(f"读取归档消息 {message_id} 失败: {e}")
+            return None
+
+        # 索引过期（文件被外部修改）时视为未找到
+        if message.get('id') != message_id:
+            return None
+        return message
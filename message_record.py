@@ -0,0 +1,211 @@
+"""
+紧凑消息记录
+活跃消息使用 __slots__ 记录保存：时间为整数时间戳，data 保存为紧凑JSON字节，第一次访问时才解析并缓存。
+记录实现了只读映射接口，可以像消息字典一样使用（msg['id']、msg.get('data')、'error' in msg）；
+序列化时直接拼接原始字节，不需要解析 data。
+启用payload去重时记录还保存data的内容哈希（ref），写入messages.json和归档时只写引用（data_ref）。
+超过大小阈值的payload转存到blob文件，记录中只保留 data_spilled（哈希、字节数和预览），data为null，
+完整的data通过单条消息接口按需从blob文件流式读取。
+"""
+import calendar
+import codecs
+import json
+import time
+from collections.abc import Mapping
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 每条记录除data字节外的大致内存开销（记录对象、ID、时间、来源IP等）
+RECORD_OVERHEAD = 200
+
+# data尚未解析的标记（data本身可能为null）
+_UNPARSED = object()
+
+
+def encode_data(data):
+    """将data编码为紧凑JSON字节"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def parse_timestamp(timestamp):
+    """将 YYYY-MM-DD HH:MM:SS 格式的时间转换为整数时间戳（与归档段的时间戳键一致）"""
+    return calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT))
+
+
+def format_timestamp(ts):
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(ts))
+
+
+class MessageRecord(Mapping):
+    """活跃消息记录（只读映射）"""
+
+    __slots__ = ('id', 'ts', 'source_ip', 'error', 'raw', 'ref', 'spill', '_data')
+
+    def __init__(self, message_id, ts, raw, source_ip=None, error=None, data=_UNPARSED, ref=None, spill=None):
+        self.id = message_id
+        self.ts = ts
+        self.raw = raw
+        self.source_ip = source_ip
+        self.error = error
+        self.ref = ref  # 去重后data在blob存储中的哈希（未去重为None）
+        self.spill = spill  # 转存的payload信息 {'ref', 'size', 'preview'}（未转存为None）
+        self._data = data  # 已解析的data（接收时已解析过的可直接传入，避免再次解析）
+
+    @classmethod
+    def from_message(cls, message):
+        """从消息字典创建记录"""
+        if isinstance(message, cls):
+            return message
+        return cls(message['id'], parse_timestamp(message['timestamp']), encode_data(message.get('data')),
+                   source_ip=message.get('source_ip'), error=message.get('error'))
+
+    @classmethod
+    def from_stored_json(cls, line):
+        """
+        从保存的一行紧凑JSON创建记录（to_stored_json 的逆操作）：
+        data的原始字节直接切片保留，只解析其余字段，不解析也不重新编码data
+        """
+        start = line.find(b',"data":')
+        end = line.rfind(b',"source_ip":')
+        if start == -1 or end < start:
+            # 去重或转存的记录（data_ref/data_spilled）由调用方处理
+            return None
+        header = json.loads(line[:start] + line[end:])
+        return cls(header['id'], parse_timestamp(header['timestamp']), line[start + 8:end],
+                   source_ip=header.get('source_ip'), error=header.get('error'))
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.ts)
+
+    @property
+    def data(self):
+        """解析并缓存data"""
+        if self._data is _UNPARSED:
+            self._data = json.loads(self.raw)
+        return self._data
+
+    def release(self):
+        """丢弃已解析的data，只保留原始字节"""
+        self._data = _UNPARSED
+
+    def spill_to(self, digest, preview):
+        """payload已写入blob文件：记录中只保留引用和预览，不再持有data字节"""
+        self.spill = {'ref': digest, 'size': len(self.raw), 'preview': preview}
+        self.ref = digest
+        self.raw = b'null'
+        self._data = None
+
+    def keys(self):
+        keys = ['id', 'timestamp', 'data', 'source_ip'] if self.error is None \
+            else ['id', 'timestamp', 'error', 'data', 'source_ip']
+        if self.spill is not None:
+            keys.append('data_spilled')
+        return keys
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'timestamp':
+            return self.timestamp
+        if key == 'data':
+            return self.data
+        if key == 'source_ip':
+            return self.source_ip
+        if key == 'error' and self.error is not None:
+            return self.error
+        if key == 'data_spilled' and self.spill is not None:
+            return self.spill
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return (key in ('id', 'timestamp', 'data', 'source_ip') or (key == 'error' and self.error is not None)
+                or (key == 'data_spilled' and self.spill is not None))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return f'MessageRecord(id={self.id}, timestamp={self.timestamp!r}, size={len(self.raw)})'
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def to_json(self, stored=False):
+        """
+        编码为紧凑JSON字节（直接拼接data的原始字节；stored为True且已去重时只写data_ref）
+        转存的payload编码为 data:null 和 data_spilled（保存时只写data_spilled）
+        """
+        parts = [b'{"id":', str(self.id).encode('ascii'), b',"timestamp":"', self.timestamp.encode('ascii'), b'"']
+        if self.error is not None:
+            parts += [b',"error":', json.dumps(self.error, ensure_ascii=False).encode('utf-8')]
+        if self.spill is not None:
+            if not stored:
+                parts.append(b',"data":null')
+            parts += [b',"data_spilled":', json.dumps(self.spill, ensure_ascii=False).encode('utf-8')]
+        elif stored and self.ref is not None:
+            parts += [b',"data_ref":"', self.ref.encode('ascii'), b'"']
+        else:
+            parts += [b',"data":', self.raw]
+        parts += [b',"source_ip":', json.dumps(self.source_ip).encode('utf-8'), b'}']
+        return b''.join(parts)
+
+    def to_stored_json(self):
+        """写入messages.json和归档时的编码"""
+        return self.to_json(stored=True)
+
+    def memory_size(self):
+        """记录占用内存的估算字节数（去重的data由相同payload的记录共用，只计引用；转存的data只计预览）"""
+        if self.spill is not None:
+            data_size = len(self.ref) + len(self.spill['preview'])
+        else:
+            data_size = len(self.ref) if self.ref is not None else len(self.raw)
+        return RECORD_OVERHEAD + data_size + (len(self.error) if self.error else 0)
+
+
+def compact_payload(payload):
+    """
+    将请求体作为data的原始字节：单行且为UTF-8时直接使用（去掉首尾空白），
+    否则返回None，由调用方重新编码（记录需要保持单行以便直接写入NDJSON归档）
+    """
+    payload = payload.strip()
+    if b'\n' in payload or b'\r' in payload or payload.startswith(codecs.BOM_UTF8):
+        return None
+    try:
+        payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    return payload
+
+
+def json_default(value):
+    """json.dumps 的 default 参数：消息记录按字典序列化"""
+    if isinstance(value, MessageRecord):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def split_records(data):
+    """将 dump_records 的输出拆分为每条记录的字节（不是该格式时抛出ValueError）"""
+    lines = data.strip().split(b'\n')
+    if lines == [b'[]']:
+        return []
+    if lines[0] != b'[' or lines[-1] != b']':
+        raise ValueError('不是逐行记录格式')
+    records = []
+    for line in lines[1:-1]:
+        line = line.rstrip(b',')
+        if not line.startswith(b'{"id":'):
+            raise ValueError('不是逐行记录格式')
+        records.append(line)
+    return records
+
+
+def dump_records(records):
+    """将消息记录列表编码为JSON数组字节（每行一条紧凑记录，去重的data只写引用）"""
+    if not records:
+        return b'[]'
+    return b'[\n' + b',\n'.join(record.to_stored_json() for record in records) + b'\n]'
@@ -0,0 +1,632 @@
+"""
+消息存储分区
+每个分区有自己的活跃消息文件、归档目录和索引（消息ID索引、全文索引、字段索引、归档清单），
+以及独立的消息ID序列、存储版本、写入锁和payload去重blob目录。默认分区对应 /webhook，每个命名来源（/webhook/<source>）
+使用 DATA_DIR/sources/<来源名>/ 下的独立分区，不同来源的写入和查询互不影响。
+
+持久化：messages.json 是活跃消息的快照（每行一条紧凑记录），之后接收的消息追加到 messages.log，
+启动时加载快照并只重放日志尾部；归档、清空或日志达到 SNAPSHOT_INTERVAL 条时重写快照并清空日志。
+消息ID高水位保存在 store_state.json 中，分配ID不需要读取归档。
+
+并发模型：同一分区的写入（接收、归档、清空）由写入锁串行化；活跃消息列表写时复制，
+写入方在锁内生成新列表后与新版本号一起作为快照整体发布，读取方（分页、搜索、统计）
+取得的快照不会再变化，不需要加锁，也不会阻塞写入。
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config import config
+from message_index import MessageIndex
+from search_index import SearchIndex
+from field_index import FieldIndex
+from message_record import MessageRecord, dump_records, split_records, parse_timestamp
+from blob_store import BlobStore, BLOB_DIR_NAME
+from archive_segments import (open_segment, SEGMENT_SUFFIX, LEGACY_SUFFIX, COLD_SUFFIX, load_legacy_archive,
+                              store_archive_messages, convert_to_cold, find_cold_candidates, find_expired_archives,
+                              remove_archive, archive_refs, repair_sidecar, Manifest)
+
+MAX_ACTIVE_MESSAGES = config.MAX_ACTIVE_MESSAGES
+ACTIVE_MEMORY_BUDGET = config.ACTIVE_MEMORY_BUDGET
+COLD_ARCHIVE_AFTER_DAYS = config.COLD_ARCHIVE_AFTER_DAYS
+SUMMARY_PREVIEW_LENGTH = config.SUMMARY_PREVIEW_LENGTH
+PAYLOAD_DEDUP = config.PAYLOAD_DEDUP
+PAYLOAD_DEDUP_MIN_SIZE = config.PAYLOAD_DEDUP_MIN_SIZE
+PAYLOAD_SPILL_SIZE = config.PAYLOAD_SPILL_SIZE
+SNAPSHOT_INTERVAL = config.SNAPSHOT_INTERVAL
+
+LOG_SUFFIX = '.log'
+STATE_FILE_NAME = 'store_state.json'
+
+ARCHIVE_FORMATS = {SEGMENT_SUFFIX: 'ndjson', COLD_SUFFIX: 'cold', LEGACY_SUFFIX: 'json'}
+
+
+def load_archive_messages(archive_info):
+    """读取一个归档文件中的全部消息"""
+    if archive_info['format'] != 'json':
+        with open_segment(archive_info['file']) as segment:
+            return list(segment.iter_records())
+    return load_legacy_archive(archive_info['file'])
+
+
+def build_message_summary(message, event_type=None, size=None):
+    """生成消息摘要：ID、时间、事件类型、来源IP、字节大小和截断的预览"""
+    spilled = message.get('data_spilled')
+    if spilled:
+        # 转存的payload使用保存时生成的预览，不读取blob文件
+        encoded = spilled['preview']
+        size = spilled['size'] if size is None else size
+    elif isinstance(message, MessageRecord) and not message.raw.startswith(b'"'):
+        # 活跃消息记录直接使用data的原始字节，不需要解析
+        encoded = message.raw.decode('utf-8')
+    elif isinstance(message.get('data'), str):
+        encoded = message['data']
+    else:
+        encoded = json.dumps(message.get('data'), ensure_ascii=False, separators=(',', ':'))
+
+    if size is None:
+        size = len(encoded.encode('utf-8'))
+    if event_type is None and isinstance(message.get('data'), dict):
+        event_type = message['data'].get('event')
+
+    summary = {
+        'id': message['id'],
+        'timestamp': message['timestamp'],
+        'event': str(event_type) if event_type else None,
+        'source_ip': message.get('source_ip'),
+        'size': size,
+        'preview': encoded[:SUMMARY_PREVIEW_LENGTH],
+        'truncated': bool(spilled) or len(encoded) > SUMMARY_PREVIEW_LENGTH
+    }
+    if 'error' in message:
+        summary['error'] = message['error']
+    return summary
+
+
+class MeteredLock:
+    """带争用统计的可重入锁：获取次数、需要等待的次数、累计/最长等待时间和持有时间"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._acquired_at = 0.0
+        # 统计只在持有锁时修改
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.hold_time = 0.0
+        self.max_hold = 0.0
+
+    def acquire(self):
+        if not self._lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            waited = time.perf_counter() - start
+            self.contended += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        self._depth += 1
+        if self._depth == 1:
+            self.acquisitions += 1
+            self._acquired_at = time.perf_counter()
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            held = time.perf_counter() - self._acquired_at
+            self.hold_time += held
+            self.max_hold = max(self.max_hold, held)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self):
+        acquisitions = self.acquisitions
+        return {
+            'acquisitions': acquisitions,
+            'contended': self.contended,
+            'contention_rate': round(self.contended / acquisitions, 4) if acquisitions else 0,
+            'wait_ms': round(self.wait_time * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'hold_ms': round(self.hold_time * 1000, 3),
+            'max_hold_ms': round(self.max_hold * 1000, 3)
+        }
+
+
+class StoreSnapshot:
+    """活跃消息的只读快照：消息列表（最新在前）和对应的存储版本一起发布"""
+
+    __slots__ = ('messages', 'version', 'boot_id', 'last_modified')
+
+    def __init__(self, messages, version, boot_id, last_modified):
+        self.messages = messages
+        self.version = version
+        self.boot_id = boot_id
+        self.last_modified = last_modified
+
+    @property
+    def etag(self):
+        return f'{self.boot_id}-{self.version}'
+
+
+class MessageStore:
+    """一个消息存储分区（活跃消息、归档及其索引）"""
+
+    def __init__(self, name, messages_file, archive_dir, indexed_fields=(), retention_days=0, on_change=None,
+                 on_stats=None):
+        started = time.perf_counter()
+        self.name = name  # 来源名，默认分区为空字符串
+        self.messages_file = Path(messages_file)
+        self.log_file = self.messages_file.with_suffix(LOG_SUFFIX)  # 快照之后接收的消息（每行一条）
+        self.state_file = self.messages_file.with_name(STATE_FILE_NAME)
+        self.log_records = 0
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
+        self.on_change = on_change  # 存储变更时的回调（如清除查询结果缓存）
+        self.on_stats = on_stats  # 统计增量的回调（如通过实时推送发出）
+        self.lock = MeteredLock()  # 写入锁（接收、归档、清空），只在同一分区内互斥
+
+        # 内容寻址的payload存储（关闭去重后仍用于读取已有的引用）
+        self.blobs = BlobStore(self.messages_file.parent / BLOB_DIR_NAME, min_size=PAYLOAD_DEDUP_MIN_SIZE,
+                               compact_interval=SNAPSHOT_INTERVAL)
+
+        # 修复上次异常退出时未写完的归档段索引（运行中读取方不写文件，只由写入方修复）
+        for archive_info in self.get_archived_files():
+            if archive_info['format'] == 'ndjson':
+                try:
+                    repair_sidecar(archive_info['file'])
+                except Exception as e:
+                    print(f"修复归档段索引失败 {archive_info['file']}: {e}")
+
+        # 归档消息ID索引（为旧版本留下的归档文件补建索引）
+        self.message_index = MessageIndex(self.archive_dir)
+        self.message_index.ensure_indexed(info['file'] for info in self.get_archived_files())
+        self.migrate_cold_archives()
+
+        # 加载快照并重放日志尾部（已归档的记录跳过）
+        loaded = time.perf_counter()
+        messages = [msg for msg in self.load_messages() if self.message_index.lookup(msg.id) is None]
+        snapshot_records = len(messages)
+        replayed = time.perf_counter()
+        messages, log_complete = self.replay_log(messages)
+        replay_records = len(messages) - snapshot_records
+
+        # 消息ID高水位（保存的状态、活跃消息和归档索引中的最大值，ID不会因归档被删除而重复）
+        self.last_id = max(self.load_state().get('max_id', 0), max((msg.id for msg in messages), default=0),
+                           max(self.message_index.entries, default=0))
+
+        # 存储版本（单调递增，用于ETag和条件请求；加入启动标识避免重启后版本号重复）
+        self.boot_id = os.urandom(4).hex()
+        self.version_lock = threading.Lock()
+        self._snapshot = StoreSnapshot(messages, 0, self.boot_id, datetime.now(timezone.utc).replace(microsecond=0))
+        if not log_complete:
+            # 日志末尾有未写完的记录：重写快照，之后的记录不会追加在残缺行之后
+            self.write_snapshot(messages)
+        indexed = time.perf_counter()
+
+        # 归档清单（各归档段的消息数和时间范围）
+        self.manifest = Manifest(self.archive_dir)
+
+        # 全文搜索索引（活跃消息在内存中，归档消息按归档段保存）
+        self.search_index = SearchIndex(self.archive_dir)
+        for msg in self.messages:
+            self.search_index.add_active(msg)
+            msg.release()
+        for archive_info in self.get_archived_files():
+            try:
+                self.search_index.ensure_segment_indexed(archive_info['file'],
+                                                         lambda info=archive_info: load_archive_messages(info))
+            except Exception as e:
+                print(f"建立搜索索引失败 {archive_info['file']}: {e}")
+
+        # 字段二级索引
+        self.field_index = FieldIndex(self.archive_dir, list(indexed_fields))
+        self.field_index.set_paths(self.field_index.paths, self.messages)
+        for msg in self.messages:
+            msg.release()
+
+        # 活跃消息摘要（接收时生成，列表摘要模式直接使用）
+        self.summaries = {msg['id']: build_message_summary(msg) for msg in self.messages}
+
+        # 启动耗时（毫秒）
+        finished = time.perf_counter()
+        self.startup = {
+            'total_ms': round((finished - started) * 1000, 1),
+            'archive_index_ms': round((loaded - started) * 1000, 1),
+            'snapshot_ms': round((replayed - loaded) * 1000, 1),
+            'log_replay_ms': round((indexed - replayed) * 1000, 1),
+            'active_index_ms': round((finished - indexed) * 1000, 1),
+            'snapshot_records': snapshot_records,
+            'log_records': replay_records
+        }
+        print(f"存储分区已加载 [{self.label}]: 快照 {snapshot_records} 条, 日志 {replay_records} 条, "
+              f"用时 {self.startup['total_ms']} ms")
+
+    # ---------- 活跃消息 ----------
+
+    def snapshot(self):
+        """当前的只读快照（读取方在一次请求内使用同一个快照）"""
+        return self._snapshot
+
+    @property
+    def messages(self):
+        """当前活跃消息列表（已发布的列表不会再被修改）"""
+        return self._snapshot.messages
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def last_modified(self):
+        return self._snapshot.last_modified
+
+    @property
+    def etag(self):
+        return self._snapshot.etag
+
+    def publish(self, messages):
+        """发布新的活跃消息列表：列表和递增后的版本号作为新快照整体替换，然后通知变更"""
+        with self.version_lock:
+            self._snapshot = StoreSnapshot(messages, self._snapshot.version + 1, self.boot_id,
+                                           datetime.now(timezone.utc).replace(microsecond=0))
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def report_stats(self, **delta):
+        """报告统计增量（消息数、活跃消息数、归档消息数、归档文件数、按事件类型的接收数）"""
+        if self.on_stats is not None:
+            self.on_stats(self, delta)
+
+    def load_messages(self):
+        """从快照文件加载消息（逐行切片data字节，不解析payload；旧版本的格式整体解析）"""
+        try:
+            if self.messages_file.exists():
+                data = self.messages_file.read_bytes()
+                try:
+                    return [self._load_line(line) for line in split_records(data)]
+                except ValueError:
+                    return [self._load_record(msg) for msg in json.loads(data)]
+        except Exception as e:
+            print(f"加载消息失败 [{self.label}]: {e}")
+        return []
+
+    def replay_log(self, messages):
+        """
+        重放快照之后追加的日志记录，返回 (活跃消息列表, 日志是否完整)
+        已在快照或归档中的记录（重写快照后未及清空日志）被跳过
+        """
+        if not self.log_file.exists():
+            return messages, True
+        known = {msg.id for msg in messages}
+        replayed = []
+        complete = True
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    complete = False
+                    break
+                try:
+                    record = self._load_line(line.rstrip(b'\n'))
+                except ValueError as e:
+                    print(f"重放消息日志失败 [{self.label}]: {e}")
+                    complete = False
+                    break
+                self.log_records += 1
+                if record.id in known or self.message_index.lookup(record.id) is not None:
+                    continue
+                known.add(record.id)
+                replayed.append(record)
+        replayed.reverse()  # 最新消息在前
+        return replayed + messages, complete
+
+    def _load_line(self, line):
+        """快照或日志中的一行记录转换为消息记录"""
+        record = MessageRecord.from_stored_json(line)
+        if record is None:
+            record = self._load_record(json.loads(line))
+        return record
+
+    def _load_record(self, message):
+        """messages.json中的记录转换为消息记录（去重的data从blob存储读取，相同payload共用内容；转存的data不读取）"""
+        spill = message.get('data_spilled')
+        if spill is not None:
+            return MessageRecord(message['id'], parse_timestamp(message['timestamp']), b'null',
+                                 source_ip=message.get('source_ip'), error=message.get('error'), data=None,
+                                 ref=spill['ref'], spill=spill)
+        digest = message.get('data_ref')
+        if digest is None:
+            return MessageRecord.from_message(message)
+        return MessageRecord(message['id'], parse_timestamp(message['timestamp']), self.blobs.get(digest),
+                             source_ip=message.get('source_ip'), error=message.get('error'), ref=digest)
+
+    def save(self, messages=None, appended=None):
+        """
+        发布并保存活跃消息（messages为新的活跃消息列表，默认为当前列表），
+        超过上限的旧消息先归档，并清理过期归档。
+        appended 为新接收的消息：没有消息被归档且日志未满时只追加到日志，否则重写快照
+        """
+        with self.lock:
+            if messages is None:
+                messages = self.messages
+            try:
+                # 先归档旧消息，再发布剩余的活跃消息
+                remaining = self.archive_old_messages(messages)
+                self.apply_retention()
+                self.publish(remaining)
+
+                if appended is not None and remaining is messages and self.log_records < SNAPSHOT_INTERVAL:
+                    self.append_log(appended)
+                else:
+                    self.write_snapshot(remaining)
+                return True
+            except Exception as e:
+                print(f"保存消息失败 [{self.label}]: {e}")
+                return False
+
+    def append_log(self, message):
+        """将新消息追加到日志（每行一条紧凑记录）"""
+        with open(self.log_file, 'ab') as f:
+            f.write(message.to_stored_json() + b'\n')
+        self.log_records += 1
+
+    def write_snapshot(self, messages):
+        """
+        重写快照并清空日志：先保存ID高水位，再原子替换快照文件，最后清空日志
+        （中途退出时日志中的记录在重放时按ID跳过）
+        """
+        self.save_state()
+        tmp_path = self.messages_file.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(dump_records(messages))
+        tmp_path.replace(self.messages_file)
+        with open(self.log_file, 'wb'):
+            pass
+        self.log_records = 0
+        # blob引用计数随快照一起压缩
+        self.blobs.compact()
+
+    def load_state(self):
+        """读取保存的分区状态（消息ID高水位）"""
+        try:
+            if self.state_file.exists():
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"加载分区状态失败 [{self.label}]: {e}")
+        return {}
+
+    def save_state(self):
+        tmp_path = self.state_file.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'max_id': self.last_id}, f)
+        tmp_path.replace(self.state_file)
+
+    def add_message(self, message, event_type=None, size=None):
+        """
+        接收一条消息：建立索引、插入活跃列表头部并保存
+        message 可以是带有已解析data的消息记录，或者消息字典（错误消息）
+        """
+        with self.lock:
+            record = MessageRecord.from_message(message)
+            spilled = PAYLOAD_SPILL_SIZE and len(record.raw) > PAYLOAD_SPILL_SIZE
+            if spilled:
+                # 大payload写入blob文件，内存和messages.json中只保留引用和预览；
+                # 索引也只使用预览（与归档和重启后重建的索引一致，字段索引不包含这类消息）
+                digest, _ = self.blobs.put(record.raw, remember=False)
+                preview = record.raw[:SUMMARY_PREVIEW_LENGTH * 4].decode('utf-8', 'ignore')[:SUMMARY_PREVIEW_LENGTH]
+                record.spill_to(digest, preview)
+                message = record
+
+            # 用已解析的数据建立索引，之后活跃列表中只保留原始字节
+            self.search_index.add_active(message)
+            self.field_index.add_active(message)
+            message = record
+            if not spilled:
+                message.release()
+                if PAYLOAD_DEDUP and message.ref is None and self.blobs.accepts(message.raw):
+                    # 相同的payload只保存一份，记录中只保留引用
+                    message.ref, message.raw = self.blobs.put(message.raw)
+            summary = self.summaries[message.id] = build_message_summary(message, event_type=event_type, size=size)
+
+            # 新列表（最新消息在前）；超过上限的旧消息在保存时归档，不会被丢弃
+            self.last_id = max(self.last_id, message.id)
+            if self.save([message] + self.messages, appended=message):
+                self.report_stats(total_messages=1, active_messages=1, events={summary['event'] or 'unknown': 1})
+        return message
+
+    def clear(self):
+        """清空活跃消息（归档保留）"""
+        with self.lock:
+            count = len(self.messages)
+            self.blobs.release([msg.ref for msg in self.messages if msg.ref is not None])
+            self.summaries.clear()
+            self.search_index.clear_active()
+            self.field_index.clear_active()
+            saved = self.save([])
+            if saved and count:
+                self.report_stats(total_messages=-count, active_messages=-count)
+            return saved
+
+    def set_indexed_fields(self, paths):
+        with self.lock:
+            self.field_index.set_paths(paths, self.messages)
+
+    def next_message_id(self):
+        """获取下一个消息ID（ID高水位在内存中维护，不读取归档；需要在写入锁内调用并随后写入消息）"""
+        return self.last_id + 1
+
+    def get_message_by_id(self, message_id):
+        """按ID查找单条消息（先查活跃消息，再通过ID索引读取归档）"""
+        for msg in self.messages:
+            if msg.get('id') == message_id:
+                return msg
+
+        return self.message_index.read_message(message_id)
+
+    def fetch_message(self, message_id, active_by_id):
+        """按ID读取消息（活跃消息直接从字典取，归档消息通过消息ID索引读取）"""
+        return active_by_id.get(message_id) or self.message_index.read_message(message_id)
+
+    def get_message_summary(self, message):
+        """获取消息摘要，活跃消息使用接收时预先生成的摘要"""
+        summary = self.summaries.get(message['id'])
+        if summary is not None and summary['timestamp'] == message['timestamp']:
+            return summary
+        return build_message_summary(message)
+
+    # ---------- 归档 ----------
+
+    def get_archived_files(self):
+        """获取所有归档文件列表（NDJSON归档段、压缩冷归档和旧版JSON归档）"""
+        try:
+            archive_files = []
+            for file_path in self.archive_dir.glob('messages_*'):
+                if file_path.suffix not in ARCHIVE_FORMATS:
+                    continue
+                date_str = file_path.stem.replace('messages_', '')
+                archive_files.append({
+                    'date': date_str,
+                    'file': str(file_path),
+                    'size': file_path.stat().st_size,
+                    'format': ARCHIVE_FORMATS[file_path.suffix]
+                })
+            return sorted(archive_files, key=lambda x: x['date'], reverse=True)
+        except Exception as e:
+            print(f"获取归档文件失败 [{self.label}]: {e}")
+            return []
+
+    def refresh_manifest(self, archived_files=None):
+        """同步归档清单，返回 {文件名: 清单条目}"""
+        if archived_files is None:
+            archived_files = self.get_archived_files()
+        return self.manifest.refresh(info['file'] for info in archived_files)
+
+    def archive_old_messages(self, messages):
+        """归档旧消息到时间文件夹，返回剩余的活跃消息列表（归档失败时原样返回）"""
+        try:
+            # 计算需要归档的消息数量（超过条数上限或内存预算时归档最旧的消息）
+            archive_count = max(0, len(messages) - MAX_ACTIVE_MESSAGES)
+            if ACTIVE_MEMORY_BUDGET > 0:
+                kept = len(messages) - archive_count
+                active_bytes = sum(msg.memory_size() for msg in messages[:kept])
+                while kept > 1 and active_bytes > ACTIVE_MEMORY_BUDGET:
+                    kept -= 1
+                    active_bytes -= messages[kept].memory_size()
+                archive_count = len(messages) - kept
+
+            if archive_count == 0:
+                return messages
+
+            # 获取需要归档的消息（最旧的消息）
+            messages_to_archive = messages[-archive_count:]
+            files_before = len(self.get_archived_files())
+
+            # 按时间分组归档
+            archive_groups = {}
+            for msg in messages_to_archive:
+                timestamp = datetime.strptime(msg['timestamp'], '%Y-%m-%d %H:%M:%S')
+                date_key = timestamp.strftime('%Y-%m-%d')
+
+                if date_key not in archive_groups:
+                    archive_groups[date_key] = []
+                archive_groups[date_key].append(msg)
+
+            # 写入NDJSON归档段并记录每条消息的字节位置
+            for date_key, group in archive_groups.items():
+                segment_name, locations = store_archive_messages(self.archive_dir, date_key, group)
+                self.message_index.update(segment_name, locations)
+                self.search_index.add_to_segment(segment_name, group)
+                segment_info = {'file': str(self.archive_dir / segment_name), 'format': 'ndjson'}
+                self.field_index.add_to_segment(segment_name, group,
+                                                lambda info=segment_info: load_archive_messages(info))
+
+            # 较旧的归档段转换为压缩冷归档
+            self.migrate_cold_archives()
+
+            # 从活跃消息中移除已归档的消息
+            for msg in messages_to_archive:
+                self.summaries.pop(msg['id'], None)
+
+            print(f"已归档 {archive_count} 条消息 [{self.label}]")
+            self.report_stats(active_messages=-archive_count, archived_messages=archive_count,
+                              archived_files=len(self.get_archived_files()) - files_before)
+            return messages[:-archive_count]
+
+        except Exception as e:
+            print(f"归档消息失败 [{self.label}]: {e}")
+            return messages
+
+    def migrate_cold_archives(self):
+        """将超过COLD_ARCHIVE_AFTER_DAYS天的归档段转换为压缩冷归档"""
+        if COLD_ARCHIVE_AFTER_DAYS <= 0:
+            return
+
+        for segment_path in find_cold_candidates(self.archive_dir, COLD_ARCHIVE_AFTER_DAYS):
+            try:
+                cold_name, locations = convert_to_cold(segment_path,
+                                                       codec=config.COLD_ARCHIVE_CODEC,
+                                                       block_records=config.COLD_ARCHIVE_BLOCK_RECORDS)
+                self.message_index.update(cold_name, locations)
+                print(f"已转换为冷归档: {segment_path.name} → {cold_name}")
+            except Exception as e:
+                print(f"转换冷归档失败 {segment_path.name}: {e}")
+
+    def apply_retention(self):
+        """删除超过保留天数的归档文件及其索引（retention_days为0时永久保留）"""
+        if not self.retention_days or self.retention_days <= 0:
+            return 0
+
+        removed = 0
+        for path in find_expired_archives(self.archive_dir, self.retention_days):
+            try:
+                count = Manifest.describe(path)['count']
+                self.blobs.release(archive_refs(path))
+                remove_archive(path)
+                self.message_index.drop_segment(path.name)
+                self.search_index.drop_segment(path.name)
+                self.field_index.drop_segment(path.name)
+                removed += 1
+                self.report_stats(total_messages=-count, archived_messages=-count, archived_files=-1)
+                print(f"已删除过期归档 [{self.label}]: {path.name}")
+            except Exception as e:
+                print(f"删除过期归档失败 {path.name}: {e}")
+        return removed
+
+    # ---------- 版本和统计 ----------
+
+    @property
+    def label(self):
+        return self.name or 'default'
+
+    def stats(self):
+        """分区统计（归档消息数从归档清单读取，不打开归档文件）"""
+        messages = self.messages
+        archived_files = self.get_archived_files()
+        manifest_entries = self.refresh_manifest(archived_files)
+        active_count = len(messages)
+        total_archived_messages = sum(entry['count'] for entry in manifest_entries.values())
+        return {
+            'source': self.name or None,
+            'total_messages': active_count + total_archived_messages,
+            'active_messages': active_count,
+            'active_bytes': sum(msg.memory_size() for msg in messages),
+            'archived_messages': total_archived_messages,
+            'archived_files': len(archived_files),
+            'recent_messages': min(active_count, 24),  # 最近24条最近消息
+            'blobs': self.blobs.stats(),
+            'write_lock': self.lock.stats(),
+            'last_id': self.last_id,
+            'log_records': self.log_records,
+            'startup': self.startup
+        }
@@ -0,0 +1,150 @@
+"""
+Webhook请求体读取和签名验证
+按块读取请求体并同时增量计算HMAC，超过大小限制时立即停止读取；
+超过内存阈值的请求体写入临时文件，签名验证通过后由JSON解析器直接从文件读取。
+签名验证支持多个同时有效的密钥（密钥轮换）和多个签名头部/算法，
+每个密钥和算法的HMAC初始状态只计算一次，每个请求复制后使用。
+"""
+import hmac
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+# 支持的签名算法（签名值的前缀，如 sha256=xxxx）
+SIGNATURE_ALGORITHMS = ('sha1', 'sha256', 'sha512')
+
+
+class BodyTooLarge(Exception):
+    """请求体超过大小限制"""
+
+
+def split_secrets(value):
+    """解析密钥设置：字符串每行一个密钥，或密钥列表；忽略空行"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.splitlines()
+    return [secret.strip() for secret in value if secret and secret.strip()]
+
+
+def parse_signature(value, algorithm):
+    """
+    解析签名头部的值，返回 (算法, 小写十六进制签名)；算法由头部的配置决定，
+    签名值的前缀（如 sha256=）与配置的算法不同时返回None（不允许发送方改用更弱的算法）
+    """
+    value = value.strip()
+    prefix, sep, digest = value.partition('=')
+    if not sep:
+        digest = value
+    elif prefix.strip().lower() != algorithm:
+        return None
+    if algorithm not in SIGNATURE_ALGORITHMS or not digest.strip():
+        return None
+    return algorithm, digest.strip().lower()
+
+
+class SignatureVerifier:
+    """
+    一组密钥的签名验证器（密钥不变时可以在请求之间复用）
+    headers: {签名头部: 该头部使用的算法}
+    """
+
+    def __init__(self, secrets, headers):
+        self.secrets = split_secrets(secrets)
+        self.headers = dict(headers)
+        self._templates = {}  # 算法 -> 每个密钥已设置好密钥的HMAC对象
+
+    def __bool__(self):
+        return bool(self.secrets)
+
+    def template(self, algorithm):
+        """获取算法对应的HMAC初始状态（第一次使用时计算）"""
+        templates = self._templates.get(algorithm)
+        if templates is None:
+            templates = [hmac.new(secret.encode('utf-8'), digestmod=algorithm) for secret in self.secrets]
+            self._templates[algorithm] = templates
+        return templates
+
+    def extract(self, request_headers):
+        """从请求头中提取所有可识别的签名 [(算法, 签名)]"""
+        signatures = []
+        for header, algorithm in self.headers.items():
+            value = request_headers.get(header)
+            if value:
+                parsed = parse_signature(value, algorithm)
+                if parsed is not None and parsed not in signatures:
+                    signatures.append(parsed)
+        return signatures
+
+    def start(self, signatures):
+        """为一个请求创建签名检查（只为请求中出现的算法复制HMAC状态）"""
+        return SignatureCheck(self, signatures)
+
+
+class SignatureCheck:
+    """一个请求的增量签名计算"""
+
+    def __init__(self, verifier, signatures):
+        self.signatures = signatures
+        self.macs = {algorithm: [mac.copy() for mac in verifier.template(algorithm)]
+                     for algorithm in {algorithm for algorithm, _ in signatures}}
+
+    def update(self, chunk):
+        for macs in self.macs.values():
+            for mac in macs:
+                mac.update(chunk)
+
+    def matched_secret(self):
+        """返回签名匹配的密钥序号（0为第一个密钥），都不匹配时返回None"""
+        for algorithm, signature in self.signatures:
+            for index, mac in enumerate(self.macs[algorithm]):
+                if hmac.compare_digest(mac.hexdigest(), signature):
+                    return index
+        return None
+
+
+class WebhookBody:
+    """已读取的请求体（内存或临时文件），可同时进行增量签名计算"""
+
+    def __init__(self, stream, max_size=0, spill_size=1024 * 1024, signature_check=None):
+        self.file = tempfile.SpooledTemporaryFile(max_size=spill_size)
+        self.spill_size = spill_size
+        self.size = 0
+        self.signature_check = signature_check
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.size += len(chunk)
+                if max_size and self.size > max_size:
+                    raise BodyTooLarge(f'请求体超过 {max_size} 字节')
+                if signature_check is not None:
+                    signature_check.update(chunk)
+                self.file.write(chunk)
+        except BaseException:
+            self.file.close()
+            raise
+        self.file.seek(0)
+
+    @property
+    def spilled(self):
+        """请求体是否已写入临时文件"""
+        return self.size > self.spill_size
+
+    def verify(self):
+        """签名是否与任一密钥匹配（需要在创建时传入签名检查）"""
+        return self.signature_check is not None and self.signature_check.matched_secret() is not None
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,58 @@
+"""
+HTTP响应压缩
+按请求的 Accept-Encoding 协商 gzip/deflate，超过大小阈值的可压缩响应整体压缩；
+SSE等流式响应使用流式压缩器，每个数据块压缩后立即同步刷新（Z_SYNC_FLUSH），客户端不需要等待后续数据就能解压。
+"""
+import zlib
+
+# 支持的内容编码（按优先顺序）及对应的zlib窗口参数
+ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,  # gzip头部和尾部
+    'deflate': zlib.MAX_WBITS,    # HTTP的deflate为zlib格式
+}
+
+# 值得压缩的响应类型（图片、压缩包等已压缩的内容不再压缩）
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'text/')
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+
+
+def choose_encoding(accept_encodings):
+    """按请求的 Accept-Encoding（werkzeug的Accept对象）选择编码，不接受压缩时返回None"""
+    return accept_encodings.best_match(list(ENCODINGS))
+
+
+def compress_body(body, encoding, level=6):
+    """整体压缩响应体"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, ENCODINGS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+
+class StreamCompressor:
+    """流式压缩器：所有数据块共用一个压缩上下文（压缩率接近整体压缩），每块之后同步刷新"""
+
+    def __init__(self, encoding, level=6):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, ENCODINGS[encoding])
+
+    def compress(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+    def stream(self, chunks):
+        """压缩可迭代的数据块（客户端断开时关闭原迭代器）"""
+        try:
+            for chunk in chunks:
+                data = self.compress(chunk)
+                if data:
+                    yield data
+            yield self.finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
@@ -0,0 +1,147 @@
+"""
+查询结果缓存
+按字节数限制大小的LRU缓存，用于分页、搜索和过滤的查询结果。
+缓存键中包含存储版本和归档清单版本，数据变化后旧结果不会再被命中；
+存储发生变更（接收、归档、清空）时调用 invalidate() 立即释放该分区的旧结果。
+另有按消息缓存的预编码片段（消息JSON、摘要JSON、Dashboard消息行HTML）。
+"""
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from message_record import MessageRecord, RECORD_OVERHEAD
+
+
+def estimate_size(value):
+    """
+    估算结果占用的字节数（按JSON编码后的长度逐项累加）
+    活跃消息记录按原始data字节的长度计算，不解析data（记录本身由活跃列表持有）
+    """
+    if isinstance(value, MessageRecord):
+        return RECORD_OVERHEAD + len(value.raw)
+    if isinstance(value, (bytes, str)):
+        return len(value) + 2
+    if isinstance(value, Mapping):
+        return 2 + sum(len(str(key)) + 4 + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 2 + sum(estimate_size(item) + 1 for item in value)
+    return len(str(value))
+
+
+class ResultCache:
+    """按字节数限制大小的LRU缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # 键 -> (结果, 字节数)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存结果，未命中时返回None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """写入缓存结果，超过容量时淘汰最久未使用的结果（单个结果超过容量时不缓存）"""
+        if self.max_bytes <= 0:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, scope=None):
+        """清空缓存结果；指定scope时只清除键的第一项等于scope的结果（如某个存储分区）"""
+        with self.lock:
+            if scope is None:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.current_bytes = 0
+                return
+            stale = [key for key in self.entries if key[0] == scope]
+            if stale:
+                self.invalidations += 1
+            for key in stale:
+                self.current_bytes -= self.entries.pop(key)[1]
+
+    def stats(self):
+        """缓存命中、未命中、淘汰等统计"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+class FragmentCache:
+    """
+    预编码片段缓存：消息接收后不再变化，其JSON编码和HTML行只需生成一次。
+    按 (存储分区, 片段类型, 消息ID, 消息时间) 缓存，按条数限制大小（LRU）；
+    也用于缓存以版本号为键的其他片段（如Dashboard的归档信息）
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, kind, message, build, scope=''):
+        """获取消息的片段，未缓存时调用build(message)生成（不同分区的消息ID可能相同，用scope区分）"""
+        return self.lookup((scope, kind, message['id'], message['timestamp']), lambda: build(message))
+
+    def lookup(self, key, build):
+        """按任意键获取片段（如按归档清单版本缓存的归档信息），未缓存时调用build()生成"""
+        with self.lock:
+            fragment = self.entries.get(key)
+            if fragment is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = build()
+        if self.max_entries > 0:
+            with self.lock:
+                self.entries[key] = fragment
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
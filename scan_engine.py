@@ -0,0 +1,158 @@
+"""
+归档并行扫描引擎
+没有索引可用的查询（未建立索引的字段过滤、关键词匹配、时间范围）需要逐条扫描归档文件。
+扫描引擎把归档文件分配到进程池，过滤条件和字段投影在工作进程中执行，只把命中的结果传回；
+主进程按提交顺序依次产出每个文件的结果，调用方停止迭代（如客户端断开）时取消尚未开始的任务。
+"""
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from archive_segments import LEGACY_SUFFIX, open_segment, load_legacy_archive, timestamp_key
+from field_index import extract_path, match_filters
+from search_index import tokenize, message_terms
+
+# 工作进程的启动方式
+WORKER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def build_spec(filters=None, query='', start_key=None, end_key=None, fields=None):
+    """
+    构建扫描条件（普通字典，可直接传给工作进程）
+    filters: {JSON路径: 值}；query: 关键词（所有词都需出现）；fields: 投影字段路径列表，为空时返回完整消息
+    """
+    return {
+        'filters': dict(filters or {}),
+        'terms': list(dict.fromkeys(tokenize(query or ''))),
+        'start_key': start_key,
+        'end_key': end_key,
+        'fields': list(fields or [])
+    }
+
+
+def project(message, fields):
+    """按字段路径投影消息，fields为空时返回完整消息"""
+    if not fields:
+        return message
+    return {path: extract_path(message, path) for path in fields}
+
+
+def match_spec(message, spec, check_time=True):
+    """检查消息是否满足扫描条件"""
+    if check_time and (spec['start_key'] is not None or spec['end_key'] is not None):
+        key = timestamp_key(message['timestamp'])
+        if spec['start_key'] is not None and key < spec['start_key']:
+            return False
+        if spec['end_key'] is not None and key > spec['end_key']:
+            return False
+    if spec['filters'] and not match_filters(message, spec['filters']):
+        return False
+    if spec['terms']:
+        terms = message_terms(message)
+        if not all(term in terms for term in spec['terms']):
+            return False
+    return True
+
+
+def scan_messages(messages, spec):
+    """在内存消息列表上执行扫描，返回投影后的命中结果"""
+    return [project(msg, spec['fields']) for msg in messages if match_spec(msg, spec)]
+
+
+def scan_file(path, spec):
+    """
+    扫描一个归档文件（在工作进程中执行），按时间从新到旧返回投影后的命中结果；
+    归档段先按时间范围二分定位，只解码范围内的记录
+    """
+    path = Path(path)
+    if path.suffix == LEGACY_SUFFIX:
+        messages = sorted(load_legacy_archive(path), key=lambda x: x['timestamp'], reverse=True)
+        return scan_messages(messages, spec)
+
+    results = []
+    with open_segment(path) as segment:
+        start, stop = segment.index_range(spec['start_key'], spec['end_key'])
+        for i in range(stop - 1, start - 1, -1):
+            message = segment.read(i)
+            if match_spec(message, spec, check_time=False):
+                results.append(project(message, spec['fields']))
+    return results
+
+
+class ScanEngine:
+    """按文件并行扫描归档的进程池（进程池在第一次使用时创建）"""
+
+    def __init__(self, max_workers=0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 服务器是多线程的（请求线程、定时刷新、存储锁），fork出的子进程可能继承被其他线程持有的锁而死锁，
+                # 因此由干净的 forkserver 进程创建工作进程（Windows等不支持forkserver的平台使用spawn）
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+            return self._executor
+
+    def scan(self, paths, spec, cancel_event=None):
+        """
+        按paths的顺序逐个产出 (文件路径, 命中结果列表)
+        同时最多提交 2×工作进程数 个文件，生成器关闭或cancel_event被设置时取消尚未开始的任务
+        """
+        paths = [str(path) for path in paths]
+        if self.max_workers <= 1 or len(paths) <= 1:
+            # 单个文件或禁用进程池时直接在当前线程扫描
+            for path in paths:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield path, self._scan_inline(path, spec)
+            return
+
+        executor = self._get_executor()
+        pending = deque()
+        remaining = iter(paths)
+        try:
+            for path in remaining:
+                pending.append((path, executor.submit(scan_file, path, spec)))
+                if len(pending) >= 2 * self.max_workers:
+                    break
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                path, future = pending.popleft()
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    # 工作进程异常退出，丢弃进程池，下次扫描时重新创建
+                    self.shutdown()
+                    raise
+                except Exception as e:
+                    print(f"扫描归档文件失败 {path}: {e}")
+                    results = []
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(scan_file, next_path, spec)))
+                yield path, results
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _scan_inline(path, spec):
+        try:
+            return scan_file(path, spec)
+        except Exception as e:
+            print(f"扫描归档文件失败 {path}: {e}")
+            return []
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
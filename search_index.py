@@ -0,0 +1,205 @@
+"""
+全文倒排索引
+对消息data中的键名和字符串值分词，建立 词 -> {消息ID: 词频} 的倒排索引。
+活跃消息的索引保存在内存中，归档消息的索引按归档段保存为 messages_YYYY-MM-DD.fts，
+与归档段一起合并和删除。
+"""
+import json
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+# 英文/数字按单词切分，中文按单字切分
+TOKEN_PATTERN = re.compile(r'[0-9a-z_]+|[\u4e00-\u9fff]')
+MAX_TOKEN_LENGTH = 64
+
+INDEX_SUFFIX = '.fts'
+
+
+def tokenize(text):
+    """将文本切分为小写词列表"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+
+def iter_text(value):
+    """遍历JSON数据中的键名和字符串值"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield str(key)
+            yield from iter_text(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_text(item)
+    elif isinstance(value, str):
+        yield value
+
+
+def message_terms(message):
+    """统计消息中每个词的出现次数（错误消息同时索引错误信息；转存的大payload只索引预览）"""
+    terms = Counter()
+    spilled = message.get('data_spilled')
+    for text in iter_text(spilled['preview'] if spilled else message.get('data')):
+        terms.update(tokenize(text))
+    if message.get('error'):
+        terms.update(tokenize(message['error']))
+    return terms
+
+
+class PostingIndex:
+    """一组消息的倒排索引"""
+
+    def __init__(self, postings=None, doc_lengths=None):
+        self.postings = postings or {}
+        self.doc_lengths = doc_lengths or {}
+
+    def add(self, message_id, terms):
+        self.remove(message_id, terms)
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[message_id] = count
+        self.doc_lengths[message_id] = sum(terms.values())
+
+    def remove(self, message_id, terms):
+        if message_id not in self.doc_lengths:
+            return
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(message_id, None)
+                if not docs:
+                    del self.postings[term]
+        del self.doc_lengths[message_id]
+
+    def clear(self):
+        self.postings = {}
+        self.doc_lengths = {}
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def to_bytes(self):
+        data = {
+            'postings': {term: list(docs.items()) for term, docs in self.postings.items()},
+            'docs': list(self.doc_lengths.items())
+        }
+        return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def from_bytes(cls, raw):
+        data = json.loads(zlib.decompress(raw))
+        postings = {term: dict(docs) for term, docs in data['postings'].items()}
+        return cls(postings, dict(data['docs']))
+
+
+class SearchIndex:
+    """活跃消息内存索引 + 归档段索引文件"""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = Path(archive_dir)
+        self.active = PostingIndex()
+        self.lock = threading.Lock()
+        self._segment_cache = {}  # 索引文件路径 -> (修改时间, PostingIndex)
+
+    def index_path(self, segment_name):
+        return self.archive_dir / (Path(segment_name).stem + INDEX_SUFFIX)
+
+    # ---------- 活跃消息 ----------
+
+    def add_active(self, message):
+        with self.lock:
+            self.active.add(message['id'], message_terms(message))
+
+    def remove_active(self, message):
+        with self.lock:
+            self.active.remove(message['id'], message_terms(message))
+
+    def clear_active(self):
+        with self.lock:
+            self.active.clear()
+
+    # ---------- 归档段 ----------
+
+    def load_segment(self, path):
+        """读取归档段索引（按修改时间缓存）"""
+        path = Path(path)
+        mtime = path.stat().st_mtime_ns
+        cached = self._segment_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        index = PostingIndex.from_bytes(path.read_bytes())
+        self._segment_cache[path] = (mtime, index)
+        return index
+
+    def add_to_segment(self, segment_name, messages):
+        """将归档的消息合并到对应归档段的索引文件，并从活跃索引中移除"""
+        path = self.index_path(segment_name)
+        with self.lock:
+            index = self.load_segment(path) if path.exists() else PostingIndex()
+            for msg in messages:
+                terms = message_terms(msg)
+                index.add(msg['id'], terms)
+                self.active.remove(msg['id'], terms)
+            tmp_path = path.with_suffix(INDEX_SUFFIX + '.tmp')
+            tmp_path.write_bytes(index.to_bytes())
+            tmp_path.replace(path)
+
+    def drop_segment(self, segment_name):
+        """删除归档段索引（随归档段一起清理）"""
+        path = self.index_path(segment_name)
+        with self.lock:
+            self._segment_cache.pop(path, None)
+            if path.exists():
+                path.unlink()
+
+    def ensure_segment_indexed(self, segment_name, load_messages):
+        """为没有索引文件的归档段建立索引"""
+        if not self.index_path(segment_name).exists():
+            self.add_to_segment(segment_name, load_messages())
+
+    def segment_indexes(self):
+        for path in sorted(self.archive_dir.glob('messages_*' + INDEX_SUFFIX)):
+            try:
+                yield self.load_segment(path)
+            except Exception as e:
+                print(f"读取搜索索引失败 {path.name}: {e}")
+
+    # ---------- 查询 ----------
+
+    def search(self, query, include_archived=True):
+        """
+        搜索包含所有查询词的消息，按TF-IDF得分排序（同分时新消息在前）
+        返回 [(消息ID, 得分), ...]
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self.lock:
+            indexes = [self.active]
+            if include_archived:
+                indexes.extend(self.segment_indexes())
+
+            total_docs = sum(len(index) for index in indexes)
+            document_frequency = {term: sum(len(index.postings.get(term, ())) for index in indexes)
+                                  for term in terms}
+            if not total_docs or not all(document_frequency.values()):
+                return []
+
+            idf = {term: math.log(1 + total_docs / document_frequency[term]) for term in terms}
+            scores = {}
+            for index in indexes:
+                # 从最稀有的词开始求交集
+                ordered = sorted(terms, key=lambda term: len(index.postings.get(term, ())))
+                candidates = set(index.postings.get(ordered[0], ()))
+                for term in ordered[1:]:
+                    if not candidates:
+                        break
+                    candidates &= index.postings.get(term, {}).keys()
+                for message_id in candidates:
+                    length_norm = math.sqrt(index.doc_lengths.get(message_id, 1) or 1)
+                    scores[message_id] = sum(index.postings[term][message_id] * idf[term]
+                                             for term in terms) / length_norm
+
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
@@ -185,11 +185,14 @@ def run_tests():
     import os
     data_dir = "webhook_data"
     messages_file = os.path.join(data_dir, "messages.json")
+    log_file = os.path.join(data_dir, "messages.log")
     settings_file = os.path.join(data_dir, "settings.json")
     
-    if os.path.exists(messages_file):
-        size = os.path.getsize(messages_file)
-        print(f"✅ 消息文件已生成: {messages_file} ({size} bytes)")
+    # 新消息先追加到 messages.log，定期合并到 messages.json 快照
+    found = [path for path in (messages_file, log_file) if os.path.exists(path)]
+    if found:
+        for path in found:
+            print(f"✅ 消息文件已生成: {path} ({os.path.getsize(path)} bytes)")
     else:
         print(f"❌ 消息文件未找到: {messages_file}")
     
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+测试Webhook接收和查询接口（使用Flask测试客户端，不需要启动服务）
+数据写在临时目录中。
+"""
+
+import gzip
+import hmac
+import json
+import os
+import shutil
+import tempfile
+
+# 服务配置需要在导入app之前设置
+TEST_DIR = tempfile.mkdtemp(prefix='webhook_ingest_')
+os.environ['DATA_DIR'] = TEST_DIR
+os.environ['MAX_WEBHOOK_BODY_SIZE'] = '65536'
+os.environ['WEBHOOK_SPILL_SIZE'] = '1024'
+os.environ['ENABLE_SIGNATURE_VERIFICATION'] = 'true'
+os.environ['RESPONSE_COMPRESSION'] = 'true'
+os.environ['COMPRESSION_MIN_SIZE'] = '256'
+
+client = None
+app_module = None
+
+
+def start_app():
+    """导入app并登录（在函数中导入，扫描进程重新导入本脚本时不会启动应用）"""
+    global client, app_module
+    import app
+    app_module = app
+    app.webhook_settings['secret'] = ''  # 默认不验证签名，签名验证测试中单独设置密钥
+    client = app.app.test_client()
+    client.post('/login', data={'username': app.config.ADMIN_USERNAME, 'password': app.config.ADMIN_PASSWORD})
+
+
+def post(body, headers=None, content_type='application/json'):
+    return client.post('/webhook', data=body, content_type=content_type, headers=headers or {})
+
+
+def post_message(data):
+    """发送一条消息并返回消息ID"""
+    return post(json.dumps(data).encode('utf-8')).get_json()['id']
+
+
+def check(condition, description):
+    if not condition:
+        raise AssertionError(description)
+    print(f"✅ {description}")
+
+
+
+def test_etag():
+    """测试消息列表和统计接口的ETag/304"""
+    print("🏷️ 测试ETag和304...")
+    post_message({'event': 'push'})
+    for url in ('/api/messages', '/api/stats'):
+        response = client.get(url)
+        etag = response.headers.get('ETag')
+        check(response.status_code == 200 and etag, f"{url} 返回ETag")
+        check(client.get(url, headers={'If-None-Match': etag}).status_code == 304, f"{url} 数据未变化时返回304")
+
+    etag = client.get('/api/messages').headers.get('ETag')
+    post_message({'event': 'ping'})
+    check(client.get('/api/messages', headers={'If-None-Match': etag}).status_code == 200, "有新消息后ETag失效")
+    return True
+
+
+
+def test_since_id():
+    """测试since_id增量轮询"""
+    print("\n🔁 测试增量轮询...")
+    latest_id = client.get('/api/messages').get_json()['messages'][0]['id']
+    new_id = post_message({'event': 'ping'})
+
+    result = client.get(f'/api/messages?since_id={latest_id}').get_json()
+    check([msg['id'] for msg in result['messages']] == [new_id] and result['latest_id'] == new_id,
+          "since_id只返回更新的消息")
+    check(client.get(f'/api/messages?since_id={new_id}').get_json()['messages'] == [], "没有新消息时返回空列表")
+    return True
+
+
+
+def test_time_range():
+    """测试时间范围参数（无效值返回400，只到分钟的结束时间包含整分钟）"""
+    print("\n🕒 测试时间范围参数...")
+    message_id = post_message({'event': 'push'})
+    timestamp = app_module.default_store.get_message_by_id(message_id)['timestamp']
+
+    check(client.get('/api/messages?from=not-a-date').status_code == 400, "无效的时间参数返回400")
+    result = client.get(f'/api/messages?to={timestamp[:16]}').get_json()
+    check(message_id in [msg['id'] for msg in result['messages']], "只到分钟的结束时间包含整分钟")
+    return True
+
+
+
+def test_non_json_body():
+    """测试非JSON请求体按错误消息保存原始内容"""
+    print("\n📝 测试非JSON请求体...")
+    response = post(b'hello', content_type='text/plain')
+    check(response.status_code == 400, "非JSON请求体返回400")
+    store = app_module.default_store
+    message = store.get_message_by_id(store.last_id)
+    check(message['data'] == 'hello' and 'error' in message, "保存解码后的原始内容和错误信息")
+    check(post(b'', content_type='application/json').status_code == 400, "空请求体返回400")
+    return True
+
+
+
+def test_body_limits():
+    """测试请求体大小限制和暂存到临时文件的大请求体"""
+    print("\n📦 测试请求体大小限制...")
+    big = json.dumps({'event': 'upload', 'items': ['数据'] * 1000}, ensure_ascii=False).encode('utf-8')
+    response = post(big)
+    check(response.status_code == 200, "超过内存阈值的请求体从临时文件解析")
+    message = app_module.default_store.get_message_by_id(response.get_json()['id'])
+    check(message['data'] == json.loads(big), "暂存的请求体内容完整保存")
+
+    too_large = b'{"x": "' + b'a' * 70000 + b'"}'
+    check(post(too_large).status_code == 413, "超过大小限制时返回413")
+    return True
+
+
+
+def sign(body, secret, algorithm='sha256'):
+    return f'{algorithm}=' + hmac.new(secret.encode('utf-8'), body, algorithm).hexdigest()
+
+
+def test_signature_verification():
+    """测试签名验证（密钥轮换、多个签名头部和算法）"""
+    print("\n🔐 测试签名验证...")
+    old_secret, new_secret = 'old-secret', 'new-secret'
+    app_module.webhook_settings['secret'] = f'{old_secret}\n{new_secret}'
+    body = json.dumps({'event': 'push', 'ref': 'refs/heads/main'}).encode('utf-8')
+    try:
+        check(post(body).status_code == 401, "缺少签名时返回401")
+        check(post(body, {'X-Hub-Signature-256': 'sha256=' + '0' * 64}).status_code == 401, "签名错误时返回401")
+        check(post(body, {'X-Hub-Signature-256': sign(body, old_secret)}).status_code == 200, "旧密钥签名在轮换期间有效")
+        check(post(body, {'X-Hub-Signature-256': sign(body, new_secret)}).status_code == 200, "新密钥签名有效")
+        check(post(body, {'X-Hub-Signature': sign(body, new_secret, 'sha1')}).status_code == 200, "sha1签名头部有效")
+        check(post(body, {'X-Signature': sign(body, new_secret)[len('sha256='):]}).status_code == 200,
+              "没有算法前缀时使用头部配置的算法")
+        check(post(body, {'X-Hub-Signature-256': sign(body, new_secret, 'sha1')}).status_code == 401,
+              "算法前缀与头部配置的算法不同时签名无效（不能降级为sha1）")
+        check(post(body, {'X-Signature': sign(body, 'other-secret')}).status_code == 401, "其他密钥的签名无效")
+        check(post(body, {'X-Signature': sign(body, new_secret, 'md5')}).status_code == 401, "不支持的算法被拒绝")
+    finally:
+        app_module.webhook_settings['secret'] = ''
+    return True
+
+
+
+def test_event_coalescing():
+    """测试实时推送的合并帧、来源过滤和gap标记"""
+    print("\n📡 测试实时推送合并...")
+    from event_broadcast import EventBroadcaster
+
+    broadcaster = EventBroadcaster(buffer_size=5, window=0, max_batch=3)
+    subscription = broadcaster.subscribe('')
+    for i in range(4):
+        broadcaster.publish('', json.dumps({'type': 'new_message', 'data': {'id': i}}))
+    frame = json.loads(subscription.next_frame(timeout=0.1))
+    check(frame['type'] == 'batch' and frame['count'] == 3, "积压的事件合并为一帧（不超过单帧上限）")
+    check(json.loads(subscription.next_frame(timeout=0.1))['data']['id'] == 3, "剩余事件在下一帧发送")
+    check(subscription.next_frame(timeout=0.05) is None, "没有事件时超时返回（由调用方发送心跳）")
+
+    for i in range(10):
+        broadcaster.publish('other', json.dumps({'type': 'new_message', 'data': {'id': i}}))
+    broadcaster.publish('', json.dumps({'type': 'new_message', 'data': {'id': 100}}))
+    check(json.loads(subscription.next_frame(timeout=0.1))['data']['id'] == 100, "只接收订阅来源的事件")
+
+    for i in range(8):
+        broadcaster.publish('', json.dumps({'type': 'new_message', 'data': {'id': i}}))
+    frame = json.loads(subscription.next_frame(timeout=0.1))
+    check(frame == {'type': 'gap', 'missed': 8}, "落后超过缓冲区时只发送gap标记")
+    return True
+
+
+
+def test_response_compression():
+    """测试响应压缩"""
+    print("\n🗜️ 测试响应压缩...")
+    plain = client.get('/api/messages')
+    response = client.get('/api/messages', headers={'Accept-Encoding': 'gzip'})
+    check(response.headers.get('Content-Encoding') == 'gzip', "接受gzip时压缩响应")
+    check(gzip.decompress(response.data) == plain.data, "解压后与未压缩的响应一致")
+    check('Accept-Encoding' in response.headers.get('Vary', ''), "响应带有 Vary: Accept-Encoding")
+    etag = response.headers.get('ETag')
+    check(etag.startswith('W/'), "压缩响应使用弱ETag")
+    check(client.get('/api/messages', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304,
+          "压缩响应的ETag可用于条件请求")
+    return True
+
+
+def run_tests():
+    """运行所有测试"""
+    print("🚀 开始接收和查询接口测试...")
+    print(f"临时目录: {TEST_DIR}")
+    print("=" * 50)
+    start_app()
+
+    tests = [
+        ("ETag和304", test_etag),
+        ("增量轮询", test_since_id),
+        ("时间范围参数", test_time_range),
+        ("非JSON请求体", test_non_json_body),
+        ("请求体限制", test_body_limits),
+        ("签名验证", test_signature_verification),
+        ("实时推送合并", test_event_coalescing),
+        ("响应压缩", test_response_compression)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+            results.append((test_name, result))
+        except Exception as e:
+            print(f"❌ {test_name} 测试失败: {e}")
+            results.append((test_name, False))
+
+    print("\n" + "=" * 50)
+    print("📊 测试结果总结:")
+    for test_name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"  {test_name}: {status}")
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+    print(f"\n通过率: {passed}/{total} ({passed/total*100:.1f}%)")
+    return passed == total
+
+
+if __name__ == "__main__":
+    try:
+        ok = run_tests()
+    finally:
+        shutil.rmtree(TEST_DIR, ignore_errors=True)
+    raise SystemExit(0 if ok else 1)
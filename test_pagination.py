@@ -200,7 +200,10 @@ def check_files():
             try:
                 with open(messages_file, 'r', encoding='utf-8') as f:
                     messages = json.load(f)
-                    print(f"   活跃消息数量: {len(messages)}")
+                # 快照之后接收的消息在 messages.log 中（每行一条）
+                log_file = data_dir / "messages.log"
+                log_count = log_file.read_bytes().count(b'\n') if log_file.exists() else 0
+                print(f"   活跃消息数量: {len(messages) + log_count}")
             except Exception as e:
                 print(f"   读取消息文件失败: {e}")
         else:
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+测试磁盘存储格式（不需要启动服务）
+所有文件写在临时目录中。
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# 存储配置需要在导入存储模块之前设置
+TEST_DIR = tempfile.mkdtemp(prefix='webhook_formats_')
+os.environ['DATA_DIR'] = TEST_DIR
+os.environ['MAX_ACTIVE_MESSAGES'] = '5'
+os.environ['ACTIVE_MEMORY_BUDGET'] = '0'
+os.environ['COLD_ARCHIVE_AFTER_DAYS'] = '0'
+os.environ['PAYLOAD_DEDUP'] = 'true'
+os.environ['PAYLOAD_DEDUP_MIN_SIZE'] = '16'
+os.environ['PAYLOAD_SPILL_SIZE'] = '2048'
+os.environ['SNAPSHOT_INTERVAL'] = '100'
+
+from config import config
+from archive_segments import (write_segment, append_segment, open_segment, read_record_at, repair_sidecar,
+                              sidecar_path, convert_to_cold, timestamp_key, Manifest)
+from blob_store import BlobStore, read_blob
+from field_index import FieldIndex
+from search_index import SearchIndex
+from message_store import MessageStore
+from manage_archive import list_partitions, parse_args, rebuild_index
+
+
+def make_messages(start_id, count, day='2024-01-15'):
+    """生成按时间升序排列的测试消息"""
+    return [{
+        'id': start_id + i,
+        'timestamp': f'{day} 10:{i // 60:02d}:{i % 60:02d}',
+        'data': {'event': 'push', 'action': 'opened' if i % 2 else 'closed', 'text': f'测试消息 {start_id + i}'},
+        'source_ip': '127.0.0.1'
+    } for i in range(count)]
+
+
+def new_dir(name):
+    path = os.path.join(TEST_DIR, name)
+    os.makedirs(path)
+    return path
+
+
+def add_messages(store, payloads, start_second=1):
+    """按顺序向存储分区写入消息（时间为今天，避免被转换为冷归档）"""
+    today = time.strftime('%Y-%m-%d')
+    for i, data in enumerate(payloads, start_second):
+        with store.lock:
+            store.add_message({'id': store.next_message_id(), 'timestamp': f'{today} 08:00:{i:02d}',
+                               'data': data, 'source_ip': '127.0.0.1'})
+
+
+def check(condition, description):
+    if not condition:
+        raise AssertionError(description)
+    print(f"✅ {description}")
+
+
+
+def test_segment_roundtrip():
+    """测试NDJSON归档段和 .idx 索引的读写"""
+    print("🧪 测试归档段和索引文件...")
+    archive_dir = new_dir('segment/archive')
+    path = os.path.join(archive_dir, 'messages_2024-01-15.ndjson')
+
+    messages = make_messages(1, 10)
+    locations = write_segment(path, messages[:6])
+    locations.update(append_segment(path, messages[6:]))
+
+    with open_segment(path) as segment:
+        check(len(segment) == 10, "追加后段内有10条记录")
+        check([segment.read(i)['id'] for i in range(10)] == list(range(1, 11)), "记录按写入顺序解码")
+        check(segment.read(3) == messages[3], "记录内容与写入时一致")
+        start, stop = segment.index_range(timestamp_key('2024-01-15 10:00:02'), timestamp_key('2024-01-15 10:00:04'))
+        check((start, stop) == (2, 5), "按 .idx 中的时间二分查找范围")
+        check(segment.locations() == locations, "记录位置与写入时返回的一致")
+
+    offset, length = locations[7]
+    check(read_record_at(path, offset, length) == messages[6], "按消息ID索引的位置直接读取记录")
+
+    # 末尾未写完的记录被忽略，索引缺失时扫描重建
+    with open(path, 'ab') as f:
+        f.write(b'{"id": 11, "timest')
+    with open_segment(path) as segment:
+        check(len(segment) == 10, "末尾不完整的记录被忽略")
+    os.remove(sidecar_path(path))
+    check(repair_sidecar(path), "索引文件缺失时重建")
+    with open_segment(path) as segment:
+        check([segment.read(i)['id'] for i in range(len(segment))] == list(range(1, 11)), "重建的索引可以正确读取")
+    return True
+
+
+
+def test_cold_segment():
+    """测试压缩冷归档（.ndjz + .bidx）"""
+    print("\n🧊 测试压缩冷归档...")
+    archive_dir = new_dir('cold/archive')
+    path = os.path.join(archive_dir, 'messages_2024-01-15.ndjson')
+    messages = make_messages(1, 300)
+    write_segment(path, messages)
+
+    cold_name, locations = convert_to_cold(path, block_records=64)
+    cold_path = os.path.join(archive_dir, cold_name)
+    check(cold_name.endswith('.ndjz') and not os.path.exists(path), "归档段转换为冷归档并删除原文件")
+    check(os.path.exists(os.path.join(archive_dir, 'messages_2024-01-15.bidx')), "生成块索引文件")
+    with open_segment(cold_path) as segment:
+        check(len(segment) == 300, "冷归档记录数一致")
+        check(segment.read(200) == messages[200], "跨块读取记录内容一致")
+        check(segment.timestamp_at(299) == timestamp_key(messages[299]['timestamp']), "不解压读取时间戳")
+    check(read_record_at(cold_path, *locations[150]) == messages[149], "按消息ID索引的位置读取冷归档记录")
+    return True
+
+
+
+def test_search_index():
+    """测试搜索索引文件（.fts）"""
+    print("\n🔍 测试搜索索引文件...")
+    archive_dir = new_dir('search/archive')
+    messages = make_messages(1, 6)
+
+    search_index = SearchIndex(archive_dir)
+    for msg in messages:
+        search_index.add_active(msg)
+    search_index.add_to_segment('messages_2024-01-15.ndjson', messages[:4])
+
+    check(os.path.exists(os.path.join(archive_dir, 'messages_2024-01-15.fts')), "生成搜索索引文件")
+    check({message_id for message_id, _ in search_index.search('消息', include_archived=False)} == {5, 6},
+          "归档的消息从活跃索引中移除")
+
+    # 新实例只从索引文件读取
+    reloaded = SearchIndex(archive_dir)
+    check({message_id for message_id, _ in reloaded.search('消息 3')} == {3}, "从索引文件搜索归档消息")
+    check(reloaded.search('不存在的词') == [], "没有命中时返回空结果")
+    return True
+
+
+
+def test_field_index():
+    """测试字段索引文件（.fidx）"""
+    print("\n🏷️ 测试字段索引文件...")
+    archive_dir = new_dir('fields/archive')
+    messages = make_messages(1, 6)
+
+    field_index = FieldIndex(archive_dir, ['data.action'])
+    for msg in messages:
+        field_index.add_active(msg)
+    field_index.add_to_segment('messages_2024-01-15.ndjson', messages[:4], lambda: messages[:4])
+
+    check(os.path.exists(os.path.join(archive_dir, 'messages_2024-01-15.fidx')), "生成字段索引文件")
+    check(field_index.lookup({'data.action': 'opened'}) == {6}, "归档的消息从活跃索引中移除")
+
+    # 新实例只从索引文件读取（读取整段的函数不会被调用）
+    segments = [('messages_2024-01-15.ndjson', lambda: [])]
+    ids = FieldIndex(archive_dir, ['data.action']).lookup({'data.action': 'opened'}, segments)
+    check(ids == {2, 4}, "从字段索引文件查找归档消息")
+    return True
+
+
+
+def test_manifest():
+    """测试归档清单（消息数和时间范围、删除文件后清理条目、无法读取的文件被跳过）"""
+    print("\n📋 测试归档清单...")
+    archive_dir = new_dir('manifest/archive')
+    first = os.path.join(archive_dir, 'messages_2024-01-15.ndjson')
+    second = os.path.join(archive_dir, 'messages_2024-01-16.ndjson')
+    write_segment(first, make_messages(1, 5))
+    write_segment(second, make_messages(6, 5, day='2024-01-16'))
+
+    manifest = Manifest(archive_dir)
+    entries = manifest.refresh([first, second])
+    entry = entries['messages_2024-01-15.ndjson']
+    check(entry['count'] == 5 and entry['min_ts'] == timestamp_key('2024-01-15 10:00:00'), "统计消息数和时间范围")
+    check(not Manifest.overlaps(entry, start_key=timestamp_key('2024-01-16 00:00:00')), "时间范围不重叠的归档被跳过")
+
+    version = manifest.version
+    os.remove(first)
+    entries = Manifest(archive_dir).refresh([second])
+    check(list(entries) == ['messages_2024-01-16.ndjson'], "删除的归档文件从清单中移除")
+
+    broken = os.path.join(archive_dir, 'messages_2024-01-17.ndjson')
+    with open(broken, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 99, 'timestamp': 'not a time', 'data': {}}) + '\n')
+    manifest = Manifest(archive_dir)
+    entries = manifest.refresh([second, broken])
+    check(entries['messages_2024-01-17.ndjson']['count'] == 0 and 'error' in entries['messages_2024-01-17.ndjson'],
+          "时间格式错误的归档文件被跳过，不影响其他文件")
+    check(manifest.version > version, "清单变化时版本号递增")
+    return True
+
+
+
+def test_source_partitions():
+    """测试命名来源的独立存储分区和归档管理工具"""
+    print("\n🗃️ 测试来源分区...")
+    source_dir = config.SOURCES_DIR / 'github'
+    store = MessageStore('github', source_dir / 'messages.json', source_dir / 'archive')
+    add_messages(store, [{'event': 'push', 'n': n} for n in range(7)])
+    check(store.last_id == 7 and len(store.messages) == 5, "来源分区独立分配消息ID和归档")
+    check(any((source_dir / 'archive').glob('messages_*')) and not any(config.ARCHIVE_DIR.glob('messages_*')),
+          "归档写入来源自己的目录")
+
+    partitions = dict(list_partitions())
+    check(partitions.get('github') == source_dir / 'archive' and 'default' in partitions, "归档工具列出所有来源分区")
+    check(parse_args(['reindex', '--source', 'github']) == (['reindex'], 'github'), "--source 指定单个分区")
+    try:
+        parse_args(['show', '--source', '../x'])
+        rejected = False
+    except ValueError:
+        rejected = True
+    check(rejected, "无效的来源名被拒绝")
+
+    rebuild_index(source_dir / 'archive')
+    restarted = MessageStore('github', source_dir / 'messages.json', source_dir / 'archive')
+    check(restarted.get_message_by_id(1)['data'] == {'event': 'push', 'n': 0}, "重建索引后按ID读取来源的归档消息")
+    return True
+
+
+
+def test_payload_dedup():
+    """测试payload去重（共享内容、引用计数、重启后恢复）"""
+    print("\n🧬 测试payload去重...")
+    partition = new_dir('dedup')
+    messages_file = os.path.join(partition, 'messages.json')
+    archive_dir = os.path.join(partition, 'archive')
+
+    store = MessageStore('', messages_file, archive_dir)
+    shared = {'event': 'push', 'action': 'opened', 'body': '重复的payload' * 4}
+    add_messages(store, [shared] * 6 + [{'event': 'ping', 'action': 'closed'}])
+
+    check(store.blobs.stats() == {'blobs': 2, 'references': 7}, "相同payload只保存一份，每条消息一个引用")
+    active_shared = [msg for msg in store.messages if msg['data'] == shared]
+    check(all(msg.raw is active_shared[0].raw for msg in active_shared), "活跃消息共用同一份payload内容")
+
+    restarted = MessageStore('', messages_file, archive_dir)
+    check(restarted.blobs.stats() == store.blobs.stats(), "重启后blob引用计数一致")
+    check(restarted.get_message_by_id(1)['data'] == shared, "归档消息中的data_ref读取时还原")
+
+    restarted.clear()
+    check(restarted.blobs.stats() == {'blobs': 1, 'references': 2}, "清空活跃消息时释放引用（归档中的引用保留）")
+    check(BlobStore(os.path.join(partition, 'blobs')).refs == restarted.blobs.refs,
+          "引用计数从 refs.json 和 refs.log 恢复")
+    return True
+
+
+def test_blob_refs_journal():
+    """测试blob引用计数日志（追加、压缩、残缺行）"""
+    print("\n🧾 测试blob引用计数日志...")
+    blob_dir = new_dir('blobs')
+    blobs = BlobStore(blob_dir, compact_interval=1000)
+    digest, _ = blobs.put(b'{"payload":"one"}')
+    blobs.put(b'{"payload":"one"}')
+    other, _ = blobs.put(b'{"payload":"two"}')
+    check(not os.path.exists(os.path.join(blob_dir, 'refs.json')), "引用变化只追加到 refs.log")
+    blobs.release([other])
+    check(not os.path.exists(blobs.path(other)), "计数归零的blob被删除")
+    check(BlobStore(blob_dir).refs == {digest: 2}, "重启后重放 refs.log")
+
+    blobs.compact()
+    with open(os.path.join(blob_dir, 'refs.log'), 'a', encoding='ascii') as f:
+        f.write(f'1 {digest} +1\n2 {digest}')  # 已压缩的旧序号和未写完的行
+    check(BlobStore(blob_dir).refs == {digest: 2}, "已压缩的序号不重复计数，残缺行被忽略")
+    return True
+
+
+
+def test_payload_spill():
+    """测试大payload转存到blob目录（只保留引用和预览）"""
+    print("\n📤 测试大payload转存...")
+    partition = new_dir('spill')
+    messages_file = os.path.join(partition, 'messages.json')
+    archive_dir = os.path.join(partition, 'archive')
+
+    store = MessageStore('', messages_file, archive_dir)
+    big = {'event': 'upload', 'marker': 'spilledmarker', 'blob': 'x' * 5000}
+    add_messages(store, [{'event': 'ping', 'action': 'closed'}, big])
+
+    message = store.messages[0]
+    check(message.spill is not None and message['data'] is None, "活跃消息中只保留引用和预览")
+    check(os.path.getsize(os.path.join(partition, 'messages.log')) < 2048, "消息日志中不写入大payload")
+    check(json.loads(read_blob(os.path.join(partition, 'blobs'), message.ref)) == big, "blob中保存完整的payload")
+    check({message_id for message_id, _ in store.search_index.search('spilledmarker')} == {2},
+          "转存的payload按预览建立搜索索引")
+
+    restarted = MessageStore('', messages_file, archive_dir)
+    check({message_id for message_id, _ in restarted.search_index.search('spilledmarker')} == {2},
+          "重启后搜索结果一致")
+    check(restarted.messages[0].spill == message.spill, "重启后转存引用和预览一致")
+    return True
+
+
+
+def test_warm_restart():
+    """测试快照+日志热启动"""
+    print("\n♻️ 测试快照和日志热启动...")
+    partition = new_dir('store')
+    messages_file = os.path.join(partition, 'messages.json')
+    log_file = os.path.join(partition, 'messages.log')
+    archive_dir = os.path.join(partition, 'archive')
+
+    store = MessageStore('', messages_file, archive_dir)
+    add_messages(store, [{'event': 'push', 'n': n} for n in range(3)])
+    check(os.path.getsize(log_file) > 0 and not os.path.exists(messages_file), "新消息只追加到 messages.log，不重写快照")
+
+    # 日志末尾残缺的记录（写入中途退出）被忽略
+    with open(log_file, 'ab') as f:
+        f.write(b'{"id":99,"timestamp"')
+    restarted = MessageStore('', messages_file, archive_dir)
+    check([msg.to_dict() for msg in restarted.messages] == [msg.to_dict() for msg in store.messages],
+          "重启后从日志恢复活跃消息")
+    check(os.path.exists(messages_file), "日志末尾残缺时重写快照")
+
+    add_messages(restarted, [{'event': 'push', 'n': n} for n in range(3, 8)], start_second=4)
+    check(os.path.getsize(log_file) == 0, "归档旧消息时重写快照并清空日志")
+    before = [msg.to_dict() for msg in restarted.messages]
+
+    again = MessageStore('', messages_file, archive_dir)
+    check([msg.to_dict() for msg in again.messages] == before, "重启后从快照恢复活跃消息")
+    check(again.last_id == 8, "重启后消息ID高水位一致")
+    check(again.get_message_by_id(1)['data'] == {'event': 'push', 'n': 0}, "归档消息通过ID索引读取")
+    return True
+
+
+def run_tests():
+    """运行所有测试"""
+    print("🚀 开始存储格式测试...")
+    print(f"临时目录: {TEST_DIR}")
+    print("=" * 50)
+
+    tests = [
+        ("归档段和索引", test_segment_roundtrip),
+        ("压缩冷归档", test_cold_segment),
+        ("搜索索引", test_search_index),
+        ("字段索引", test_field_index),
+        ("归档清单", test_manifest),
+        ("来源分区", test_source_partitions),
+        ("payload去重", test_payload_dedup),
+        ("blob引用计数日志", test_blob_refs_journal),
+        ("大payload转存", test_payload_spill),
+        ("热启动", test_warm_restart)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+            results.append((test_name, result))
+        except Exception as e:
+            print(f"❌ {test_name} 测试失败: {e}")
+            results.append((test_name, False))
+
+    print("\n" + "=" * 50)
+    print("📊 测试结果总结:")
+    for test_name, result in results:
+        status = "✅ 通过" if result else "❌ 失败"
+        print(f"  {test_name}: {status}")
+
+    passed = sum(1 for _, result in results if result)
+    total = len(results)
+    print(f"\n通过率: {passed}/{total} ({passed/total*100:.1f}%)")
+    return passed == total
+
+
+if __name__ == "__main__":
+    try:
+        ok = run_tests()
+    finally:
+        shutil.rmtree(TEST_DIR, ignore_errors=True)
+    raise SystemExit(0 if ok else 1)